@@ -0,0 +1,48 @@
+"""
+Cost of the arrow-key edits of `TreeWidget` on a node with many children,
+e.g. the root of a pdf whose text was added flat by `extract_text`.
+
+    python _scripts/bench_children.py [n_children ...]
+
+Each step looks up the position of a random child (as `event_handler`
+does) and moves it one place up, once with the children stored as a plain
+list and once as a `ChildList`.
+"""
+
+import random
+import sys
+import time
+
+from ipypdf.widgets.better_tree import ChildList, Tree
+
+
+def build(n, children_type):
+    tree = Tree(
+        [
+            {"id": str(i), "type": "text", "children": [], "content": []}
+            for i in range(n)
+        ]
+    )
+    tree.root.data["children"] = children_type(tree.root.data["children"])
+    return tree
+
+
+def run(n, k=2000, seed=0):
+    timings = {}
+    for children_type in [list, ChildList]:
+        tree = build(n, children_type)
+        rng = random.Random(seed)
+        ids = [str(rng.randrange(n)) for _ in range(k)]
+        start = time.perf_counter()
+        for node_id in ids:
+            position = tree.root.data["children"].index(node_id)
+            tree.move(node_id, "root", max(0, position - 1))
+        timings[children_type.__name__] = (time.perf_counter() - start) / k
+    return timings
+
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in sys.argv[1:]] or [1000, 10000, 100000]
+    for n in sizes:
+        for name, seconds in run(n).items():
+            print(f"{n:>7} children {name:>9}: {seconds * 1e6:8.1f} us")
@@ -0,0 +1,90 @@
+"""
+Accuracy vs speed comparison of the layout backends in `lp_util.BACKENDS`.
+
+    python _scripts/bench_layout.py [pdf or directory] [--threads N]
+
+The stock analyzer is treated as the reference. For every other backend the
+blocks on each page are matched to the reference blocks of the same type
+(IoU >= 0.5) and the share of matched blocks is reported as agreement.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+HERE = Path(__file__).parent
+DEFAULT_DIR = HERE.parent / "tests/fixture_data"
+
+
+def iou(a, b):
+    """a, b: relative coordinates [x1, x2, y1, y2]"""
+    w = min(a[1], b[1]) - max(a[0], b[0])
+    h = min(a[3], b[3]) - max(a[2], b[2])
+    if w <= 0 or h <= 0:
+        return 0
+    inter = w * h
+    area_a = (a[1] - a[0]) * (a[3] - a[2])
+    area_b = (b[1] - b[0]) * (b[3] - b[2])
+    return inter / (area_a + area_b - inter)
+
+
+def run(model, paths):
+    from ipypdf.utils.lp_util import parse_layout
+
+    pages = []
+    start = time.perf_counter()
+    for path in paths:
+        for layout in parse_layout(str(path), model):
+            pages.append([(b.type, b.relative_coordinates) for b in layout])
+    return pages, time.perf_counter() - start
+
+
+def agreement(reference, candidate, threshold=0.5):
+    matched = 0
+    total = 0
+    for ref_page, page in zip(reference, candidate):
+        total += max(len(ref_page), len(page))
+        unused = list(page)
+        for _type, coords in ref_page:
+            for other in unused:
+                if other[0] == _type and iou(coords, other[1]) >= threshold:
+                    unused.remove(other)
+                    matched += 1
+                    break
+    return matched / total if total else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("source", nargs="?", default=str(DEFAULT_DIR))
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    import torch
+
+    from ipypdf.utils.corpus import collect_pdfs
+    from ipypdf.utils.lp_util import BACKENDS, get_analyzer
+
+    # Every backend runs with the same number of threads, so that only the
+    # model differs between them
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    print(f"{torch.get_num_threads()} threads")
+
+    source = Path(args.source)
+    paths = [source] if source.is_file() else collect_pdfs(source)
+
+    reference, ref_seconds = run(get_analyzer(), paths)
+    print(f"{'default':>10}: {ref_seconds:8.2f}s  agreement 1.000")
+    for backend in BACKENDS:
+        if backend == "default":
+            continue
+        for dtype in ["int8", "float16"]:
+            model = get_analyzer(backend=backend, dtype=dtype)
+            pages, seconds = run(model, paths)
+            print(
+                f"{backend + '/' + dtype:>10}: {seconds:8.2f}s"
+                + f"  agreement {agreement(reference, pages):.3f}"
+                + f"  speedup {ref_seconds / seconds:.2f}x"
+                + f"  converted {model.cpu_optimization}"
+            )
@@ -0,0 +1,77 @@
+"""
+Memory held by a loaded tree, per node.
+
+    python _scripts/bench_node_memory.py [n_pdfs] [nodes_per_pdf]
+
+Builds the flat node list `App.save` writes for `n_pdfs` documents (a pdf
+node with sections of text and table nodes), serialises it to json and
+measures with tracemalloc what `json.loads` and then `Tree(nodes)`
+allocate. The total is what each document costs while a corpus is open,
+and the difference is the overhead of the tree itself.
+"""
+
+import json
+import random
+import sys
+import tracemalloc
+from uuid import uuid1
+
+from ipypdf.widgets.better_tree import Tree
+
+
+def document(n, rng):
+    pdf = {"id": str(uuid1()), "type": "pdf", "label": "x.pdf", "children": []}
+    nodes = [pdf]
+    section = pdf
+    for i in range(n - 1):
+        if i % 10 == 0:
+            section = {
+                "id": str(uuid1()),
+                "type": "section",
+                "label": f"Section {i}",
+                "children": [],
+            }
+            pdf["children"].append(section["id"])
+            nodes.append(section)
+            continue
+        node = {
+            "id": str(uuid1()),
+            "type": "table" if rng.random() < 0.05 else "text",
+            "children": [],
+            "content": [
+                {
+                    "value": "lorem ipsum dolor sit amet",
+                    "page": i // 40,
+                    "coords": [rng.random() for _ in range(4)],
+                }
+            ],
+        }
+        section["children"].append(node["id"])
+        nodes.append(node)
+    return nodes
+
+
+def run(n_pdfs, per_pdf):
+    rng = random.Random(0)
+    text = json.dumps(
+        [n for _ in range(n_pdfs) for n in document(per_pdf, rng)]
+    )
+    tracemalloc.start()
+    nodes = json.loads(text)
+    loaded, _ = tracemalloc.get_traced_memory()
+    tree = Tree(nodes)
+    del nodes
+    total, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(tree.registry) - 1, loaded, total
+
+
+if __name__ == "__main__":
+    n_pdfs = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    per_pdf = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    n, loaded, total = run(n_pdfs, per_pdf)
+    print(f"{n} nodes")
+    print(
+        f"json.loads:     {loaded / 2**20:6.1f} MiB {loaded / n:5.0f} B/node"
+    )
+    print(f"+ Tree(nodes):  {total / 2**20:6.1f} MiB {total / n:5.0f} B/node")
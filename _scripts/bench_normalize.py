@@ -0,0 +1,54 @@
+"""
+Compares `nlp.normalize` with the original chain of per-token functions.
+
+    python _scripts/bench_normalize.py [n_documents]
+
+The original `remove_punctuation` used a malformed pattern which never
+matched, so it is reproduced as written and the outputs are only compared
+for speed, not equality.
+"""
+
+import random
+import re
+import sys
+import time
+
+from ipypdf.utils.nlp import normalize, normalize_many
+
+WORDS = [f"word{i}" for i in range(5000)] + [
+    "the",
+    "and",
+    "Testing",
+    "(table)",
+    "revenue,",
+    "1",
+]
+
+
+def original(sent):
+    tokens = [x.lower() for x in sent.split()]
+    tokens = [re.sub("[.,!&@%+-=()?[]{}<>\"'$.*^]", "", x) for x in tokens]
+    stops = {"a", "an", "the", "and", "to", "is", "am", "one", "two"}
+    stops |= {"three", "1", "2", "3", "or", "", "for"}
+    tokens = [x for x in tokens if x not in stops]
+    return [re.sub("ing$", "", x) for x in tokens]
+
+
+def timed(f, *args):
+    start = time.perf_counter()
+    f(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rng = random.Random(0)
+    docs = {i: " ".join(rng.choices(WORDS, k=200)) for i in range(n)}
+
+    before = timed(lambda: [original(x) for x in docs.values()])
+    after = timed(lambda: [normalize(x) for x in docs.values()])
+    batch = timed(normalize_many, docs)
+    print(f"{n} documents of 200 words")
+    print(f"  original:       {before:7.2f}s")
+    print(f"  normalize:      {after:7.2f}s  ({before / after:.1f}x)")
+    print(f"  normalize_many: {batch:7.2f}s  ({before / batch:.1f}x)")
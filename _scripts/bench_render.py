@@ -0,0 +1,86 @@
+"""
+Compares layout detection + OCR on a pdf with and without sharing the
+rendered pages between the two steps.
+
+    python _scripts/bench_render.py [path/to/doc.pdf]
+
+Each mode runs in a fresh interpreter so that the peak RSS reported for one
+mode is not inflated by the other.
+
+    double: each step renders the pdf itself
+    shared: both steps consume the pages in order (layout of page i, then
+        OCR of page i), so only the last two pages are kept
+    kept: layout of every page, then OCR of every page, with every page
+        kept in between. This is what AutoTools does with "Render pages
+        once" checked, and its peak RSS grows with the number of pages.
+"""
+
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+HERE = Path(__file__).parent
+DEFAULT_PDF = HERE.parent / "tests/fixture_data/sample_pdfs/doc.pdf"
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return round(psutil.Process().memory_info().peak_wset / 2**20, 1)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on linux
+    return round(rss / 2**20 if sys.platform == "darwin" else rss / 2**10, 1)
+
+
+def run(path, mode):
+    from ipypdf.utils.image_utils import ImageContainer
+    from ipypdf.utils.lp_util import dd, parse_layout
+    from ipypdf.utils.tess_utils import get_text_blocks
+
+    model = dd.get_dd_analyzer()
+    start = time.perf_counter()
+    if mode == "shared":
+        imgs = ImageContainer(path, bulk_render=False, cache=2)
+        layouts = parse_layout(path, model, images=imgs)
+        for _ in zip(layouts, get_text_blocks(path, imgs)):
+            pass
+    elif mode == "kept":
+        imgs = ImageContainer(path, bulk_render=False, cache=-1)
+        for _ in parse_layout(path, model, images=imgs):
+            pass
+        for _ in get_text_blocks(path, imgs):
+            pass
+    else:
+        for _ in parse_layout(path, model):
+            pass
+        for _ in get_text_blocks(path):
+            pass
+    return {
+        "mode": mode,
+        "seconds": time.perf_counter() - start,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--run":
+        print(json.dumps(run(sys.argv[3], sys.argv[2])))
+        sys.exit()
+
+    path = sys.argv[1] if len(sys.argv) > 1 else str(DEFAULT_PDF)
+    for mode in ["double", "shared", "kept"]:
+        out = subprocess.check_output(
+            [sys.executable, __file__, "--run", mode, path], text=True
+        )
+        result = json.loads(out.strip().splitlines()[-1])
+        print(
+            f"{result['mode']:>7}: {result['seconds']:8.2f}s"
+            + f"  peak RSS {result['peak_rss_mb']} MB"
+        )
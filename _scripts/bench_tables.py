@@ -0,0 +1,87 @@
+"""
+Times the table engines on a synthetic bordered table.
+
+    python _scripts/bench_tables.py [rows] [cols]
+
+A ruled table of `rows` x `cols` cells, each holding a number, is drawn
+at roughly 200 dpi proportions. `img_2_table` finds the grid from the word
+positions, `ruled_img_2_table` from the rules. Both run Tesseract once over
+the whole table. `per cell` runs Tesseract on every cell crop, which is
+what `ruled_img_2_table` used to do, and is included for reference.
+Cell accuracy is the share of cells whose text matches what was drawn.
+"""
+
+import sys
+import time
+
+import cv2
+import numpy as np
+import pytesseract as tess
+from PIL import Image
+
+from ipypdf.utils.table_extraction import (
+    img_2_table,
+    ruled_grid_detect,
+    ruled_img_2_table,
+)
+
+CELL_W, CELL_H = 160, 50
+
+
+def bordered_table(rows, cols):
+    w, h = cols * CELL_W + 20, rows * CELL_H + 20
+    im = np.full((h, w, 3), 255, np.uint8)
+    for r in range(rows + 1):
+        y = 10 + r * CELL_H
+        cv2.line(im, (10, y), (w - 10, y), (0, 0, 0), 2)
+    for c in range(cols + 1):
+        x = 10 + c * CELL_W
+        cv2.line(im, (x, 10), (x, h - 10), (0, 0, 0), 2)
+    truth = []
+    for r in range(rows):
+        truth.append([])
+        for c in range(cols):
+            text = f"{(r * cols + c) * 37 % 10000:,}"
+            x, y = 10 + c * CELL_W + 15, 10 + r * CELL_H + 35
+            cv2.putText(
+                im, text, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 2
+            )
+            truth[-1].append(text)
+    return Image.fromarray(im), truth
+
+
+def per_cell(im, inset=3):
+    grid = ruled_grid_detect(im)
+    n = len(set(x[0] for x in grid))
+    cells = []
+    for x, y, w, h in grid:
+        crop = im.crop((x + inset, y + inset, x + w - inset, y + h - inset))
+        cells.append(tess.image_to_string(crop, config="--psm 6").strip())
+    return [cells[i : i + n] for i in range(0, len(cells), n)]
+
+
+def accuracy(table, truth):
+    cells = [c.strip() for r in table for c in r]
+    expected = [c for r in truth for c in r]
+    if len(cells) != len(expected):
+        return 0.0
+    return sum(a == b for a, b in zip(cells, expected)) / len(expected)
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    cols = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    im, truth = bordered_table(rows, cols)
+    engines = {
+        "img_2_table": img_2_table,
+        "ruled_img_2_table": ruled_img_2_table,
+        "per cell": per_cell,
+    }
+    for name, engine in engines.items():
+        start = time.perf_counter()
+        table = engine(im)
+        seconds = time.perf_counter() - start
+        print(
+            f"{rows * cols} cells {name:>18}: {seconds:7.2f}s"
+            + f"  cell accuracy {accuracy(table, truth):.2f}"
+        )
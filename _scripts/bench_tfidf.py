@@ -0,0 +1,53 @@
+"""
+Times `tfidf_similarity` and `similarity_graph` on synthetic sections.
+
+    python _scripts/bench_tfidf.py [n_sections ...]
+
+All pairs are only requested for small inputs since the output alone grows
+with n^2. Larger inputs use the same 0.4 threshold as the Cytoscape slider.
+`similarity_graph` keeps the 10 nearest neighbours of each section, which is
+what the Cytoscape tab computes. `TfidfIndex` is then timed on a refresh
+after 5 sections were edited.
+"""
+
+import random
+import sys
+import time
+
+from ipypdf.utils.nlp import TfidfIndex, similarity_graph, tfidf_similarity
+
+VOCAB = [f"term{i}" for i in range(20000)]
+
+
+def sections(n, length=200, seed=0):
+    rng = random.Random(seed)
+    return {i: " ".join(rng.choices(VOCAB, k=length)) for i in range(n)}
+
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in sys.argv[1:]] or [1000, 2000, 10000]
+    for n in sizes:
+        docs = sections(n)
+        threshold = None if n <= 2000 else 0.4
+        start = time.perf_counter()
+        edges = tfidf_similarity(docs, threshold=threshold)
+        seconds = time.perf_counter() - start
+        print(
+            f"{n:>7} sections  threshold={threshold}:"
+            + f" {seconds:7.2f}s  {len(edges)} edges"
+        )
+        start = time.perf_counter()
+        _, S = similarity_graph(docs, top_k=10)
+        seconds = time.perf_counter() - start
+        print(
+            f"{n:>7} sections  top_k=10:" + f" {seconds:14.2f}s  {S.nnz} edges"
+        )
+        index = TfidfIndex()
+        index.similarity_graph(docs, top_k=10)
+        edits = sections(5, seed=1)
+        for i, k in enumerate(random.Random(1).sample(list(docs), 5)):
+            docs[k] = edits[i]
+        start = time.perf_counter()
+        index.similarity_graph(docs, top_k=10)
+        seconds = time.perf_counter() - start
+        print(f"{n:>7} sections  5 edits: {seconds:15.2f}s")
@@ -0,0 +1,78 @@
+"""
+Times the tree traversals on wide, random and deep trees.
+
+    python _scripts/bench_traversal.py [n_nodes ...]
+
+`recursive` is the `yield from` pre-order walk `Tree.dfs` used to be. It
+raises RecursionError on the deep tree (a single chain of sections), which
+is reported as such. `visible` is `TreeWidget._compute_visible` with every
+node opened.
+"""
+
+import random
+import sys
+import time
+
+from ipypdf.widgets.better_tree import Tree
+
+
+def wide(n):
+    return [{"id": str(i), "type": "text", "children": []} for i in range(n)]
+
+
+def bushy(n, fanout=8, seed=0):
+    rng = random.Random(seed)
+    nodes = [{"id": "0", "type": "section", "children": []}]
+    for i in range(1, n):
+        parent = nodes[max(0, len(nodes) - 1 - rng.randrange(fanout * 4))]
+        parent["children"].append(str(i))
+        nodes.append({"id": str(i), "type": "section", "children": []})
+    return nodes
+
+
+def deep(n):
+    nodes = [
+        {"id": str(i), "type": "section", "children": [str(i + 1)]}
+        for i in range(n - 1)
+    ]
+    return nodes + [{"id": str(n - 1), "type": "text", "children": []}]
+
+
+def recursive(tree, node_id="root"):
+    yield tree.registry[node_id]
+    for c in tree.registry[node_id].data["children"]:
+        yield from recursive(tree, c)
+
+
+def timed(f):
+    start = time.perf_counter()
+    try:
+        for _ in f():
+            pass
+    except RecursionError:
+        return "RecursionError"
+    return f"{time.perf_counter() - start:8.3f}s"
+
+
+def run(n):
+    for shape in [wide, bushy, deep]:
+        tree = Tree(shape(n))
+        for node in tree.registry.values():
+            node.opened = True
+        traversals = {
+            "recursive": lambda: recursive(tree),
+            "dfs": tree.dfs,
+            "postorder": tree.postorder,
+            "bfs": tree.bfs,
+            "dfs(types)": lambda: tree.dfs(types="text"),
+            "visible": lambda: tree.dfs(expand=lambda node: node.opened),
+        }
+        for name, f in traversals.items():
+            print(f"{n:>8} {shape.__name__:>6} {name:>11}: {timed(f)}")
+        del tree
+
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in sys.argv[1:]] or [10000, 100000, 1000000]
+    for n in sizes:
+        run(n)
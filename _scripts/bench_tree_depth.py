@@ -0,0 +1,75 @@
+"""
+Cost of keeping `Node.level` up to date while re-parenting nodes, as the
+arrow keys in `TreeWidget` do.
+
+    python _scripts/bench_tree_depth.py [n_nodes] [n_moves]
+
+full:        `Tree.move` followed by `Tree._compute_depth()` over the whole
+             tree (what `_housekeeping` used to do)
+incremental: `Tree.move`, which only updates the moved subtree
+visible:     `Tree.move` followed by walking up the parents of the 30 rows
+             shown by the widget, i.e. computing depth on demand. Its
+             cost on top of `incremental` is what that approach would add.
+"""
+
+import random
+import sys
+import time
+
+from ipypdf.widgets.better_tree import Tree
+
+
+def build(n, fanout=8, seed=0):
+    """A random tree of sections with `n` nodes"""
+    rng = random.Random(seed)
+    nodes = [{"id": "0", "type": "section", "children": []}]
+    for i in range(1, n):
+        parent = nodes[max(0, len(nodes) - 1 - rng.randrange(fanout * 4))]
+        parent["children"].append(str(i))
+        nodes.append({"id": str(i), "type": "section", "children": []})
+    return Tree(nodes)
+
+
+def moves(tree, k, seed=1):
+    """Random (node, new parent) pairs which keep the tree acyclic"""
+    rng = random.Random(seed)
+    ids = [i for i in tree.registry if i != "root"]
+    result = []
+    while len(result) < k:
+        node, parent = rng.choice(ids), rng.choice(ids)
+        if parent not in {n.id for n in tree.dfs(node)}:
+            result.append((node, parent))
+    return result
+
+
+def walk_up(tree, node):
+    level = 0
+    while node.parent is not None:
+        node = tree.registry[node.parent]
+        level += 1
+    return level
+
+
+def run(n, k):
+    timings = {}
+    for strategy in ["full", "incremental", "visible"]:
+        tree = build(n)
+        pairs = moves(tree, k)
+        visible = list(tree.registry.values())[:30]
+        start = time.perf_counter()
+        for node, parent in pairs:
+            tree.move(node, parent)
+            if strategy == "full":
+                tree._compute_depth()
+            elif strategy == "visible":
+                for v in visible:
+                    walk_up(tree, v)
+        timings[strategy] = (time.perf_counter() - start) / k
+    return timings
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    for strategy, seconds in run(n, k).items():
+        print(f"{strategy:>12}: {seconds * 1000:8.3f} ms per move")
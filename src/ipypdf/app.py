@@ -15,6 +15,8 @@ from .utils.image_utils import (
     rel_crop,
     scale,
 )
+from .utils.spacy_utils import prewarm
+from .utils.table_store import store_tables
 from .utils.tree_utils import file_path, load_from_json, to_dict
 from .widgets.better_tree import Tree, TreeWidget
 from .widgets.canvas import PdfCanvas
@@ -31,11 +33,23 @@ Path(DEFAULT_DIRECTORY).mkdir(exist_ok=True)
 
 
 class App(ipyw.HBox):
-    def __init__(self, directory=DEFAULT_DIRECTORY, bulk_render=False):
+    def __init__(
+        self,
+        directory=DEFAULT_DIRECTORY,
+        bulk_render=False,
+        prewarm_spacy=False,
+    ):
+        """
+        prewarm_spacy <bool> (False): Start loading the default spaCy
+            pipeline in the background. Otherwise it is loaded the first
+            time the Spacy tab is used.
+        """
         super().__init__()
         self.add_class("ipypdf-main-app")
 
         self.bulk_render = bulk_render
+        if prewarm_spacy:
+            prewarm()
         self.fname = ""
         self.active_node = None
         self.active_node_id = None
@@ -135,7 +149,8 @@ class App(ipyw.HBox):
         self.canvas.clear()
         if self.navigator.draw_bboxes.value:
             bboxes = []
-            for node in self.tree.dfs(self.active_node.id):
+            nodes = self.tree.dfs(self.active_node.id, page=self.img_index)
+            for node in nodes:
                 _type = node.data["type"]
                 for c in node.data.get("content", []):
                     if c["page"] == self.img_index:
@@ -184,20 +199,21 @@ class App(ipyw.HBox):
         self.node_detail.set_node(self.active_node)
 
     def handle_image(self, rel_coords):
-        self.active_node.data["content"].append(
-            {"value": None, "page": self.img_index, "coords": rel_coords}
+        item = {"value": None, "page": self.img_index, "coords": rel_coords}
+        self.tree.set_content(
+            self.active_node, self.active_node.data["content"] + [item]
         )
 
     def handle_table(self, rel_coords):
-        self.active_node.data["content"].append(
-            {"value": None, "page": self.img_index, "coords": rel_coords}
+        item = {"value": None, "page": self.img_index, "coords": rel_coords}
+        self.tree.set_content(
+            self.active_node, self.active_node.data["content"] + [item]
         )
 
     def handle_label(self, rel_coords):
         text = tess.image_to_string(rel_crop(self.full_img, rel_coords))
 
         selected_node = self.active_node
-        selected_node.label = text.strip()
 
         # store the coords of the headding for training purposes
         item = {
@@ -205,9 +221,8 @@ class App(ipyw.HBox):
             "page": self.img_index,
             "coords": rel_coords,
         }
-        selected_node.data["content"] = [item]
         selected_node.data["label"] = text.strip()
-        self.tree_visualizer.refresh()
+        self.tree.set_content(selected_node, [item])
         self.redraw_boxes()
 
     def handle_textblock(self, rel_coords):
@@ -217,11 +232,14 @@ class App(ipyw.HBox):
         )
 
         item = {"value": text, "page": self.img_index, "coords": rel_coords}
-        self.active_node.data["content"].append(item)
+        self.tree.set_content(
+            self.active_node, self.active_node.data["content"] + [item]
+        )
 
     def save(self, _=None):
         for id, node in self.tree.registry.items():
             if Path(id).exists() and Path(id).suffix.lower() == ".pdf":
+                store_tables(node)
                 data = to_dict(node)
                 if data:
                     with Path(id).with_suffix(".json").open(mode="w") as f:
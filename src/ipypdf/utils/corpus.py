@@ -0,0 +1,167 @@
+"""
+Batch layout analysis over a corpus of pdfs.
+
+Each worker process loads the deepdoctection analyzer once (see
+`_init_worker`) and keeps it warm for every document it is handed. The
+nodes for each document are written next to the pdf as `<name>.json`,
+which is the same file `App.save` writes and `load_from_json` reads.
+"""
+
+import json
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from .lsh import index_document
+
+_MODEL = None
+_FUSE_OCR = False
+
+
+def _init_worker(fuse_ocr=False, backend="default"):
+    global _MODEL, _FUSE_OCR
+    from .lp_util import get_analyzer
+
+    _MODEL = get_analyzer(ocr=not fuse_ocr, backend=backend)
+    _FUSE_OCR = fuse_ocr
+
+
+def _parse_document(path):
+    """
+    Runs in a worker process. Exceptions are caught and returned so that
+    a single bad pdf never stops the batch.
+    """
+    from .lp_util import layout_to_nodes, parse_layout, parse_layout_fused
+
+    start = time.perf_counter()
+    try:
+        nodes = []
+        pages = 0
+        if _FUSE_OCR:
+            layouts = parse_layout_fused(str(path), _MODEL)
+        else:
+            layouts = parse_layout(str(path), _MODEL)
+        for i, layout in enumerate(layouts):
+            nodes += layout_to_nodes(layout, i)
+            pages += 1
+        with Path(path).with_suffix(".json").open(mode="w") as f:
+            json.dump(nodes, f)
+        return {
+            "path": str(path),
+            "pages": pages,
+            "nodes": len(nodes),
+            "seconds": time.perf_counter() - start,
+            "error": None,
+        }
+    except Exception:
+        return _failure(path, time.perf_counter() - start)
+
+
+def _failure(path, seconds):
+    """Result dict for a document which raised the current exception"""
+    return {
+        "path": str(path),
+        "pages": 0,
+        "nodes": 0,
+        "seconds": seconds,
+        "error": traceback.format_exc(),
+    }
+
+
+def collect_pdfs(source):
+    """
+    source <Tree, str, Path, or list>: A `Tree` (e.g. after `Tree.rglob`),
+        a directory to search recursively, or an explicit list of paths.
+    """
+    if hasattr(source, "registry"):
+        return [
+            Path(node.id)
+            for node in source.registry.values()
+            if node.data.get("type") == "pdf"
+        ]
+    if isinstance(source, (str, Path)):
+        return sorted(Path(source).rglob("*.pdf"))
+    return [Path(p) for p in source]
+
+
+def parse_corpus(
+    source,
+    n_workers=None,
+    overwrite=False,
+    callback=None,
+    fuse_ocr=False,
+    backend="default",
+    index=None,
+    section_index=None,
+):
+    """
+    Runs `parse_layout` over every pdf in `source` using a pool of worker
+    processes.
+
+    source: see `collect_pdfs`
+    n_workers <int> (None): Number of processes (and therefore models held
+        in memory). Defaults to the number of cpus.
+    overwrite <bool> (False): Re-parse pdfs which already have a json file.
+    callback <func> (None): Called with the result dict of each document as
+        soon as it finishes. Useful for progress reporting.
+    fuse_ocr <bool> (False): Fill in block text from Tesseract instead of
+        deepdoctection's OCR (see `parse_layout_fused`).
+    backend <str> ("default"): Layout model backend (see `lp_util.BACKENDS`)
+    index <MinHashLSH> (None): Each parsed document (and any previously
+        parsed document missing from the index) is added to this index as
+        it finishes (see `lsh.index_document`). Call `index.save` to keep
+        it for the next batch.
+    section_index <MinHashLSH> (None): Same as `index`, but for the
+        sections of each document.
+
+    Returns a report dict with the overall throughput and a list of
+    per-document results. Failed documents have their traceback stored
+    under "error". This includes documents which could not be parsed
+    because the worker processes failed to start.
+    """
+    paths = collect_pdfs(source)
+    indexed = index is not None or section_index is not None
+    if not overwrite:
+        parsed = [p for p in paths if p.with_suffix(".json").exists()]
+        paths = [p for p in paths if not p.with_suffix(".json").exists()]
+        if indexed:
+            for p in parsed:
+                if index is None or str(p) not in index:
+                    index_document(index, p, section_index=section_index)
+
+    start = time.perf_counter()
+    results = []
+    if paths:
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_init_worker,
+            initargs=(fuse_ocr, backend),
+        ) as pool:
+            futures = {pool.submit(_parse_document, p): p for p in paths}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception:
+                    # The worker itself failed, e.g. the model could not be
+                    # loaded in `_init_worker` (BrokenProcessPool)
+                    result = _failure(futures[future], 0.0)
+                results.append(result)
+                if indexed and not result["error"]:
+                    index_document(
+                        index, result["path"], section_index=section_index
+                    )
+                if callback:
+                    callback(result)
+    seconds = time.perf_counter() - start
+
+    pages = sum(r["pages"] for r in results)
+    return {
+        "documents": len(results),
+        "pages": pages,
+        "seconds": seconds,
+        "documents_per_second": len(results) / seconds if seconds else 0,
+        "pages_per_second": pages / seconds if seconds else 0,
+        "failures": {r["path"]: r["error"] for r in results if r["error"]},
+        "results": results,
+    }
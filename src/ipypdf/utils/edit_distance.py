@@ -0,0 +1,95 @@
+"""
+Bit-parallel Levenshtein distance (Myers 1999, in the form given by
+Hyyrö 2003). Each column of the dynamic programming matrix is held as the
+bits of two integers, so a comparison costs one loop iteration per
+character of the second string instead of one per cell. Python integers
+have no fixed width, which lifts the usual 64 character limit.
+
+The bitmasks of the first string only depend on that string, so
+`levenshtein_many` builds them once for a query and reuses them for every
+candidate.
+"""
+
+
+def _peq(pattern):
+    """Bitmask of the positions of each character of `pattern`"""
+    peq = {}
+    for i, c in enumerate(pattern):
+        peq[c] = peq.get(c, 0) | 1 << i
+    return peq
+
+
+def _distance(peq, m, text, max_distance):
+    n = len(text)
+    if max_distance is not None and abs(m - n) > max_distance:
+        return max_distance + 1
+    if m == 0:
+        return n
+
+    ones = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv, mv = ones, 0
+    score = m
+    for j, c in enumerate(text):
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & ones)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        # each remaining character can lower the score by at most one
+        if max_distance is not None and score - (n - j - 1) > max_distance:
+            return max_distance + 1
+        ph = (ph << 1 | 1) & ones
+        mh = (mh << 1) & ones
+        pv = mh | (~(xv | ph) & ones)
+        mv = ph & xv
+    return score
+
+
+def levenshtein(s, t, max_distance=None):
+    """
+    Number of single character insertions, deletions and substitutions
+    needed to turn `s` into `t`.
+
+    max_distance <int> (None): Stop as soon as the distance is known to be
+        larger than this, and return `max_distance + 1` instead.
+    """
+    if len(s) > len(t):
+        s, t = t, s  # the shorter string makes smaller bitmasks
+    return _distance(_peq(s), len(s), t, max_distance)
+
+
+def levenshtein_many(query, candidates, max_distance=None):
+    """
+    `levenshtein(query, c, max_distance)` for every c in `candidates`.
+    """
+    peq = _peq(query)
+    m = len(query)
+    return [_distance(peq, m, c, max_distance) for c in candidates]
+
+
+def best_matches(query, candidates, limit=None, max_distance=None):
+    """
+    candidates <dict or list[str]>: The strings to match against. For a
+        dict, the values are matched and the keys are returned.
+    limit <int> (None): Maximum number of matches to return
+    max_distance <int> (None): Ignore candidates further away than this
+
+    Returns a list of (key or string, distance), closest first.
+    """
+    if isinstance(candidates, dict):
+        keys, texts = list(candidates), list(candidates.values())
+    else:
+        keys = texts = list(candidates)
+    distances = levenshtein_many(query, texts, max_distance)
+    result = [
+        (k, d)
+        for k, d in zip(keys, distances)
+        if max_distance is None or d <= max_distance
+    ]
+    result.sort(key=lambda x: x[1])
+    return result[:limit] if limit is not None else result
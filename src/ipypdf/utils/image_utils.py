@@ -1,4 +1,5 @@
 import io
+from collections import OrderedDict
 from pathlib import Path
 
 import ipywidgets as ipyw
@@ -79,26 +80,54 @@ def rel_2_cv2(rel_coords, w, h):
 
 
 class ImageContainer:
-    def __init__(self, fname, bulk_render=True, dpi=200):
+    def __init__(self, fname, bulk_render=True, dpi=200, cache=0):
+        """
+        bulk_render <bool> (True): Render every page up front.
+        cache <int> (0): Number of pages rendered on demand which are kept
+            (the most recently used ones). Use this when each page is handed
+            to several consumers in turn (e.g. layout detection followed by
+            OCR of the same page), so that it is only rendered once. A page
+            at 200 dpi takes about 11 MB, so keep this small. A negative
+            value keeps every page.
+        """
         fname = Path(fname)
 
         self.info = pdfinfo_from_path(str(fname))
         self.bulk_render = bulk_render
         self.dpi = dpi
+        self.fname = str(fname)
+        self.cache_size = cache
+        self.cache = OrderedDict() if cache else None
         if bulk_render:
             self.imgs = convert_from_path(str(fname), dpi=self.dpi)
-        else:
-            self.fname = str(fname)
+
+    def __len__(self):
+        return self.info["Pages"]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
 
     def __getitem__(self, i):
         if self.bulk_render:
             return self.imgs[i]
-        else:
-            # manual page indexing starts at 1
-            img = convert_from_path(
-                str(self.fname),
-                first_page=i + 1,
-                last_page=i + 1,
-                dpi=self.dpi,
-            )[0]
+        if self.cache is not None and i in self.cache:
+            self.cache.move_to_end(i)
+            return self.cache[i]
+        # manual page indexing starts at 1
+        img = convert_from_path(
+            str(self.fname),
+            first_page=i + 1,
+            last_page=i + 1,
+            dpi=self.dpi,
+        )[0]
+        if self.cache is not None:
+            self.cache[i] = img
+            if 0 <= self.cache_size < len(self.cache):
+                self.cache.popitem(last=False)
         return img
+
+    def clear(self):
+        """Drops the cached pages"""
+        if self.cache is not None:
+            self.cache.clear()
@@ -1,5 +1,10 @@
 
+import copy
+import inspect
 import warnings
+from pathlib import Path
+
+import numpy as np
 
 # This library prints out a bunch of model info as a warning and it looks bad
 with warnings.catch_warnings():
@@ -7,7 +12,8 @@ with warnings.catch_warnings():
     warnings.simplefilter("ignore")
     import deepdoctection as dd
 
-from .image_utils import pil_2_rel
+from .image_utils import ImageContainer, pil_2_rel
+from .tess_utils import im_to_data, words_in_boxes
 
 CHILD = dd.Relationships.CHILD
 TYPE_MAP = {
@@ -54,13 +60,143 @@ def sort_layout(layout: list):
     layout.sort(key=lambda x: (column(x.bbox), x.bbox[1]))
 
 
-def parse_layout(fname, model=None, start=0, stop=-1, ignore_warning=False):
+def get_analyzer(ocr=True, backend="default", **kwargs):
+    """
+    ocr <bool> (True): Let deepdoctection run its own OCR to fill in the
+        text of each block. Disable this when the text is filled in from
+        Tesseract instead (see `parse_layout_fused`).
+    backend <str> ("default"): Key of `BACKENDS`. Extra kwargs are passed
+        on to the backend.
+
+    Raises ValueError for an unknown backend or arguments it does not
+    take, before the model is loaded.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown backend {backend!r}, expected one of "
+            + ", ".join(repr(b) for b in BACKENDS)
+        )
+    try:
+        inspect.signature(BACKENDS[backend]).bind(None, **kwargs)
+    except TypeError as e:
+        raise ValueError(f"Backend {backend!r}: {e}") from None
+    if ocr:
+        analyzer = dd.get_dd_analyzer()
+    else:
+        analyzer = dd.get_dd_analyzer(config_overrides=["USE_OCR=False"])
+    return BACKENDS[backend](analyzer, **kwargs)
+
+
+def optimize_for_cpu(analyzer, threads=None, dtype="int8"):
+    """
+    Prepares the torch models held by the analyzer's predictors for CPU
+    inference:
+    - Linear layers are dynamically quantised to `dtype`
+    - Conv layers, where the layout detector spends most of its time,
+      can't be dynamically quantised. Their models are converted to the
+      channels-last memory format, which the CPU conv kernels prefer.
+
+    The number of converted layers is stored as
+    `analyzer.cpu_optimization = {"linear": n, "conv": m}`. A warning is
+    issued, and the stock analyzer returned, if there was nothing to
+    convert or the conversion failed.
+
+    threads <int> (None): Number of intra-op threads used by torch
+    dtype <str> ("int8"): Weight type of the linear layers, either "int8"
+        or "float16"
+    """
+    report = {"linear": 0, "conv": 0}
+    try:
+        import torch
+
+        if threads:
+            torch.set_num_threads(threads)
+        qdtype = {"int8": torch.qint8, "float16": torch.float16}[dtype]
+        # Convert everything before swapping anything in so that a failure
+        # leaves the analyzer in its original state
+        replacements = []
+        for component in analyzer.pipe_component_list:
+            predictor = getattr(component, "predictor", None)
+            if predictor is None:
+                continue
+            for name, value in vars(predictor).items():
+                if not isinstance(value, torch.nn.Module):
+                    continue
+                modules = list(value.modules())
+                linear = sum(isinstance(m, torch.nn.Linear) for m in modules)
+                conv = sum(isinstance(m, torch.nn.Conv2d) for m in modules)
+                if not (linear or conv):
+                    continue
+                converted = copy.deepcopy(value)
+                if conv:
+                    converted = converted.to(memory_format=torch.channels_last)
+                if linear:
+                    converted = torch.quantization.quantize_dynamic(
+                        converted, {torch.nn.Linear}, dtype=qdtype
+                    )
+                replacements.append((predictor, name, converted))
+                report["linear"] += linear
+                report["conv"] += conv
+        for predictor, name, converted in replacements:
+            setattr(predictor, name, converted)
+    except Exception as e:
+        warnings.warn(f"Using the stock analyzer, optimization failed: {e}")
+        report = {"linear": 0, "conv": 0}
+    else:
+        if not replacements:
+            warnings.warn(
+                "Using the stock analyzer, no torch models were found"
+            )
+    analyzer.cpu_optimization = report
+    return analyzer
+
+
+BACKENDS = {
+    "default": lambda analyzer: analyzer,
+    "cpu": optimize_for_cpu,
+}
+
+
+def images_to_dataflow(fname, images):
+    """
+    Wraps pages which have already been rendered (e.g. an `ImageContainer`)
+    in a dataflow so that deepdoctection does not rasterise the pdf again.
+    Pages are converted lazily, one at a time, as the analyzer consumes them.
+    """
+    stem = Path(fname).stem
+
+    def pages():
+        for i, img in enumerate(images):
+            page = dd.Image(file_name=f"{stem}_{i}.png", location=str(fname))
+            # deepdoctection works with BGR arrays (as read by cv2)
+            page.image = np.asarray(img.convert("RGB"))[:, :, ::-1]
+            yield page
+
+    return dd.DataFromIterable(pages())
+
+
+def parse_layout(
+    fname,
+    model=None,
+    start=0,
+    stop=-1,
+    ignore_warning=False,
+    images=None,
+):
+    """
+    images <ImageContainer or list[PIL.Image]> (None): Pages of `fname`
+        which have already been rendered. When provided they are passed
+        to the analyzer in memory instead of letting it render the pdf.
+    """
     if model is None:
         model = (
             dd.get_dd_analyzer()
         )  # instantiate the built-in analyzer similar to the Hugging Face space demo
 
-    df = model.analyze(path=fname)  # setting up pipeline
+    if images is None:
+        df = model.analyze(path=fname)  # setting up pipeline
+    else:
+        df = model.analyze(dataset_dataflow=images_to_dataflow(fname, images))
     df.reset_state()  # Trigger some initialization
 
     for page in iter(df):
@@ -71,6 +207,7 @@ def parse_layout(fname, model=None, start=0, stop=-1, ignore_warning=False):
             )
             block.type = TYPE_MAP[block.category_name]
             block.children = []
+            block.content_text = block.text
 
         sort_layout(layout)
         current_section = []
@@ -80,3 +217,69 @@ def parse_layout(fname, model=None, start=0, stop=-1, ignore_warning=False):
             else:
                 current_section.append(b.annotation_id)
         yield layout
+
+
+def parse_layout_fused(fname, model=None, images=None):
+    """
+    Same as `parse_layout`, but the text of each block comes from a single
+    word-level Tesseract pass over the page instead of deepdoctection's OCR.
+    `model` should be created with `get_analyzer(ocr=False)`.
+
+    images <ImageContainer> (None): Rendered pages of `fname`. They are
+        shared by the layout model and Tesseract, so a container caching
+        the last two pages is created if not provided.
+    """
+    if model is None:
+        model = get_analyzer(ocr=False)
+    if images is None:
+        images = ImageContainer(fname, bulk_render=False, cache=2)
+
+    for i, layout in enumerate(parse_layout(fname, model, images=images)):
+        img = images[i]
+        words = im_to_data(img)
+        texts = words_in_boxes(
+            words,
+            [block.relative_coordinates for block in layout],
+            img.width,
+            img.height,
+        )
+        for block, text in zip(layout, texts):
+            block.content_text = text
+        yield layout
+
+
+def layout_to_nodes(layout: list, page: int):
+    """
+    Converts the sorted blocks of a single page (as yielded by
+    `parse_layout`) into the flat list of node dicts accepted by
+    `Tree.add_multiple` (and stored in the json files read by
+    `load_from_json`).
+    """
+    nodes = []
+    for block in layout:
+        content = [
+            {
+                "value": None,
+                "page": page,
+                "coords": block.relative_coordinates,
+            }
+        ]
+        node = {
+            "id": block.annotation_id,
+            "content": content,
+            "children": block.children,
+        }
+        if block.type == "Title":
+            content[0]["value"] = block.content_text
+            node.update({"type": "section", "label": block.content_text})
+        elif block.type in ["List", "Text"]:
+            content[0]["value"] = block.content_text
+            node["type"] = "text"
+        elif block.type == "Figure":
+            node["type"] = "image"
+        elif block.type == "Table":
+            node.update({"type": "table", "table": block.csv})
+        else:
+            continue
+        nodes.append(node)
+    return nodes
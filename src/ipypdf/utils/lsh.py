@@ -0,0 +1,249 @@
+"""
+MinHash signatures with locality sensitive hashing for finding
+near-duplicate documents and repeated (boilerplate) sections.
+
+Each text is reduced to the set of word shingles of `nlp.normalize(text)`.
+The MinHash signature of that set is split into `bands` bands, and two
+texts become candidates if any of their bands are identical. Candidates are
+then ranked by the share of matching signature values, which estimates the
+Jaccard similarity of the shingle sets. Queries only touch the buckets of
+the query's own bands, so their cost does not grow with the corpus.
+"""
+
+import json
+from collections import defaultdict
+from itertools import combinations
+from pathlib import Path
+from zlib import crc32
+
+import numpy as np
+from scipy.sparse import coo_matrix, triu
+
+from .nlp import normalize
+
+_PRIME = (1 << 31) - 1  # a * crc32 + b stays below 2**63
+
+
+def shingles(text, k=3):
+    """Set of `k` word shingles of the normalised text"""
+    tokens = normalize(text)
+    if len(tokens) < k:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i : i + k]) for i in range(len(tokens) - k + 1)}
+
+
+class MinHashLSH:
+    """
+    num_perm <int> (128): Length of each signature
+    bands <int> (32): Number of bands the signature is split into. More
+        bands find pairs with a lower similarity (at roughly
+        (1 / bands) ** (bands / num_perm)).
+    shingle <int> (3): Number of words in each shingle
+    seed <int> (1): Seed of the hash functions. Signatures are only
+        comparable between indexes with the same parameters.
+    """
+
+    def __init__(self, num_perm=128, bands=32, shingle=3, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle = shingle
+        self.seed = seed
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _PRIME, num_perm).astype(np.uint64)
+        self._b = rng.randint(0, _PRIME, num_perm).astype(np.uint64)
+        self.signatures = {}  # key -> signature
+        self.buckets = [defaultdict(list) for _ in range(bands)]
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def __contains__(self, key):
+        return key in self.signatures
+
+    def signature(self, text):
+        """MinHash signature of `text` (None if it has no words)"""
+        sh = shingles(text, self.shingle)
+        if not sh:
+            return None
+        h = np.fromiter(
+            (crc32(s.encode()) for s in sh), dtype=np.uint64, count=len(sh)
+        )
+        h = (self._a[:, None] * h[None, :] + self._b[:, None]) % _PRIME
+        return h.min(axis=1)
+
+    def _bands(self, sig):
+        for i in range(self.bands):
+            yield i, sig[i * self.rows : (i + 1) * self.rows].tobytes()
+
+    def add(self, key, text=None, signature=None):
+        """
+        Adds (or replaces) `key`. Returns False if the text has no words.
+        """
+        if signature is None:
+            signature = self.signature(text)
+        if key in self.signatures:
+            self.remove(key)
+        if signature is None:
+            return False
+        self.signatures[key] = signature
+        for i, band in self._bands(signature):
+            self.buckets[i][band].append(key)
+        return True
+
+    def remove(self, key):
+        sig = self.signatures.pop(key)
+        for i, band in self._bands(sig):
+            bucket = self.buckets[i][band]
+            bucket.remove(key)
+            if not bucket:
+                del self.buckets[i][band]
+
+    def similarity(self, a, b):
+        """Estimated Jaccard similarity of two indexed keys"""
+        return float(np.mean(self.signatures[a] == self.signatures[b]))
+
+    def _query(self, sig, threshold, exclude=None):
+        if sig is None:
+            return []
+        candidates = set()
+        for i, band in self._bands(sig):
+            candidates.update(self.buckets[i].get(band, ()))
+        candidates.discard(exclude)
+        result = []
+        for key in candidates:
+            w = float(np.mean(self.signatures[key] == sig))
+            if w >= threshold:
+                result.append((key, w))
+        return sorted(result, key=lambda x: -x[1])
+
+    def query(self, text, threshold=0.0):
+        """
+        Indexed keys which are likely near-duplicates of `text`.
+
+        Returns a list of (key, estimated similarity), most similar first.
+        """
+        return self._query(self.signature(text), threshold)
+
+    def similar(self, key, threshold=0.0):
+        """Same as `query` for a key which is already indexed"""
+        return self._query(self.signatures[key], threshold, exclude=key)
+
+    def duplicates(self, threshold=0.5):
+        """
+        Every pair of indexed keys sharing a bucket whose estimated
+        similarity is at least `threshold`.
+
+        Returns a list of [source, target, weight], most similar first.
+        """
+        pairs = set()
+        for buckets in self.buckets:
+            for bucket in buckets.values():
+                pairs.update(combinations(bucket, 2))
+        result = []
+        for a, b in pairs:
+            w = self.similarity(a, b)
+            if w >= threshold:
+                result.append([a, b, w])
+        return sorted(result, key=lambda x: -x[2])
+
+    def graph(self, threshold=0.0):
+        """
+        `duplicates` in the same format as `nlp.similarity_graph`: (keys, S)
+        where S is an upper-triangular csr matrix.
+        """
+        keys = list(self.signatures)
+        position = {k: i for i, k in enumerate(keys)}
+        pairs = self.duplicates(threshold)
+        rows = [position[a] for a, b, _ in pairs]
+        cols = [position[b] for a, b, _ in pairs]
+        S = coo_matrix(
+            ([w for _, _, w in pairs], (rows, cols)),
+            shape=(len(keys), len(keys)),
+        )
+        return keys, triu(S + S.T, k=1).tocsr()
+
+    def save(self, path):
+        """
+        Writes the parameters and signatures to a `.npz` file. Keys must be
+        strings.
+        """
+        keys = list(self.signatures)
+        np.savez_compressed(
+            path,
+            params=json.dumps(
+                {
+                    "num_perm": self.num_perm,
+                    "bands": self.bands,
+                    "shingle": self.shingle,
+                    "seed": self.seed,
+                }
+            ),
+            keys=np.array(keys, dtype=str),
+            signatures=np.array(
+                [self.signatures[k] for k in keys], dtype=np.uint64
+            ).reshape(len(keys), self.num_perm),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            index = cls(**json.loads(str(f["params"])))
+            for key, sig in zip(f["keys"], f["signatures"]):
+                index.add(str(key), signature=sig)
+        return index
+
+
+def node_texts(nodes):
+    """
+    nodes <list[dict]>: Flat node dicts as stored in the json files written
+        by `parse_corpus` and `App.save`.
+
+    Returns {section id: text} with the text of every text node beneath
+    each section.
+    """
+    by_id = {n["id"]: n for n in nodes}
+    result = {}
+    for node in nodes:
+        if node.get("type") != "section":
+            continue
+        text = []
+        stack = list(reversed(node.get("children", [])))
+        while stack:
+            child = by_id.get(stack.pop())
+            if child is None:
+                continue
+            if child.get("type") == "text":
+                text += [c["value"] or "" for c in child["content"]]
+            stack += reversed(child.get("children", []))
+        result[node["id"]] = " ".join(text)
+    return result
+
+
+def index_document(index, path, nodes=None, section_index=None):
+    """
+    Adds the document at `path` (keyed by its path) to `index`, and each of
+    its sections (keyed by node id) to `section_index`. They are kept apart
+    so that a document is never reported as a duplicate of its own
+    sections.
+
+    nodes <list[dict]> (None): The nodes of the document. Read from
+        `<path>.json` if not provided.
+    section_index <MinHashLSH> (None): Sections are not indexed if None.
+    """
+    if nodes is None:
+        with Path(path).with_suffix(".json").open() as f:
+            nodes = json.load(f)
+    text = [
+        c["value"] or ""
+        for n in nodes
+        if n.get("type") == "text"
+        for c in n["content"]
+    ]
+    if index is not None:
+        index.add(str(path), " ".join(text))
+    if section_index is not None:
+        for node_id, text in node_texts(nodes).items():
+            section_index.add(node_id, text)
@@ -1,24 +1,29 @@
-import re
-from collections import defaultdict
+from collections import Counter
 
-from numpy import array, dot, flip, zeros
-from numpy.linalg import norm
+from numpy import (
+    arange,
+    array,
+    bincount,
+    concatenate,
+    cumsum,
+    diff,
+    full,
+    inf,
+    lexsort,
+    partition,
+    repeat,
+    searchsorted,
+    sqrt,
+    zeros,
+)
+from scipy.sparse import coo_matrix, csr_matrix, diags, triu
 
+from .edit_distance import levenshtein
 
-def tokenize(sent):
-    return sent.split()
-
-
-def case_fold(tokens):
-    return [x.lower() for x in tokens]
-
-
-def remove_punctuation(tokens):
-    return [re.sub("[.,!&@%+-=()?[]{}<>\"'$.*^]", "", x) for x in tokens]
-
-
-def rm_stop_words(tokens):
-    stops = {
+# Characters stripped from every token
+PUNCTUATION = ".,!&@%+-=()?[]{}<>\"'$*^"
+STOP_WORDS = frozenset(
+    {
         "a",
         "an",
         "the",
@@ -36,112 +41,406 @@ def rm_stop_words(tokens):
         "",
         "for",
     }
-    return [x for x in tokens if x not in stops]
+)
+_STRIP = str.maketrans("", "", PUNCTUATION)
+
+
+def tokenize(sent):
+    return sent.split()
+
+
+def case_fold(tokens):
+    return [x.lower() for x in tokens]
+
+
+def remove_punctuation(tokens):
+    return [x.translate(_STRIP) for x in tokens]
+
+
+def rm_stop_words(tokens):
+    return [x for x in tokens if x not in STOP_WORDS]
 
 
 def stem(tokens):
-    return [re.sub("ing$", "", x) for x in tokens]
+    return [x[:-3] if x.endswith("ing") else x for x in tokens]
 
 
 def normalize(sent):
-    return stem(rm_stop_words(remove_punctuation(case_fold(tokenize(sent)))))
+    """
+    Same as `stem(rm_stop_words(remove_punctuation(case_fold(tokenize(...)))))`
+    in a single pass over the tokens.
+    """
+    return [
+        x[:-3] if x.endswith("ing") else x
+        for x in sent.lower().translate(_STRIP).split()
+        if x not in STOP_WORDS
+    ]
 
 
-def tfidf_similarity(docs: dict):
-    n_docs = {k: normalize(v) for k, v in docs.items()}
+def normalize_many(docs):
+    """
+    Normalises every document in `docs`.
 
-    for k, v in list(n_docs.items()):
-        if v == "":
-            n_docs.pop(k)
+    docs <dict or iterable[str]>: Returns a dict with the same keys for a
+        dict, otherwise a list.
+    """
+    if isinstance(docs, dict):
+        return {k: normalize(v) for k, v in docs.items()}
+    return [normalize(x) for x in docs]
+
+
+def tfidf_matrix(docs: dict):
+    """
+    Builds a sparse tf-idf matrix with one L2-normalised row per document.
+    Terms which appear in fewer than 2 documents or in more than 80% of
+    them are dropped, as are documents left without any terms.
+
+    Returns (keys, X) where keys[i] is the key of row i of X.
+    """
+    n_docs = normalize_many(docs)
 
     MIN_DF_COUNT = 2
     MAX_DF_COUNT = len(n_docs) * 0.8
 
-    df = defaultdict(int)
-    tf = defaultdict(lambda: defaultdict(int))
-
     # count appearance in docs
-    for k, v in n_docs.items():
-        for w in set(v):
-            df[w] += 1
+    df = Counter()
+    for v in n_docs.values():
+        df.update(set(v))
 
     # feature reduction
-    for w, c in list(df.items()):
-        if c < MIN_DF_COUNT or c > MAX_DF_COUNT:
-            df.pop(w)
+    vocab = {}
+    for w, c in df.items():
+        if MIN_DF_COUNT <= c <= MAX_DF_COUNT:
+            vocab[w] = len(vocab)
+    idf = 1 / array([df[w] for w in vocab], dtype=float)
 
     # count occurences in each doc
+    keys, rows, cols, counts = [], [], [], []
     for k, v in n_docs.items():
-        for w in v:
-            if w in df:
-                tf[k][w] += 1
+        tf = Counter(vocab[w] for w in v if w in vocab)
+        if not tf:
+            continue
+        rows += [len(keys)] * len(tf)
+        cols += tf.keys()
+        counts += tf.values()
+        keys.append(k)
 
     # quantify importance of each term to the doc
-    tfidf = defaultdict(dict)
-    for k, v in tf.items():
-        for w in v:
-            tfidf[k][w] = v[w] / df[w]
-
-    one_hot_sparse = {k: i for i, k in enumerate(df)}
-    N = len(df)
-
-    def some_hot(word, weight=1):  # might not be one, so ... some
-        v = zeros(N)
-        v[one_hot_sparse[word]] = weight
-        return v
-
-    def encode_doc(doc_tfidf):
-        v = zeros(N)
-        for word, weight in doc_tfidf.items():
-            v += some_hot(word, weight)
-        return v
-
-    if len(tfidf) == 0:
+    cols = array(cols, dtype=int)
+    X = csr_matrix(
+        (array(counts, dtype=float) * idf[cols], (rows, cols)),
+        shape=(len(keys), len(vocab)),
+    )
+    norms = sqrt(X.multiply(X).sum(axis=1)).A1
+    return keys, diags(1 / norms) @ X
+
+
+def tfidf_similarity(docs: dict, threshold=None):
+    """
+    Cosine similarity of the tf-idf vectors of `docs`.
+
+    threshold <float> (None): Only return pairs with a similarity above
+        this value. All pairs are returned when None.
+
+    Returns a list of [source, target, weight] for each pair of documents.
+    """
+    keys, X = tfidf_matrix(docs)
+    if len(keys) == 0:
         return {}
-    doc_vectors = {k: encode_doc(v) for k, v in tfidf.items()}
-    doc_keys, X = zip(*doc_vectors.items())
-    X = array(X)
-    sim = [
-        dot(X[i + 1 :], x) / (norm(X[i + 1 :], axis=1) * norm(x))
-        for i, x in enumerate(X)
-    ]  # cosine similarity between all other docs
-    dr = doc_keys[::-1]
-
-    # return a list of source,target,weight pairs
-    return sum(
-        [
-            [[key] + list(t_w) for t_w in list(zip(dr, flip(sim_vector)))]
-            for key, sim_vector in zip(doc_keys, sim)
-        ],
-        [],
+    sim = X @ X.T  # cosine similarity between all docs
+
+    if threshold is None:
+        sim = sim.toarray()
+        return [
+            [keys[i], keys[j], sim[i, j]]
+            for i in range(len(keys))
+            for j in range(len(keys) - 1, i, -1)
+        ]
+
+    sim = triu(sim, k=1).tocoo()
+    keep = sim.data > threshold
+    rows, cols, weights = sim.row[keep], sim.col[keep], sim.data[keep]
+    order = lexsort((-cols, rows))
+    return [
+        [keys[i], keys[j], w]
+        for i, j, w in zip(rows[order], cols[order], weights[order])
+    ]
+
+
+def _top_k_per_row(rows, cols, data, k):
+    """
+    Mask keeping the `k` largest values of each row. Ties go to the lowest
+    column, so the result does not depend on the order of the entries.
+    """
+    order = lexsort((cols, -data.round(12), rows))
+    rows = rows[order]
+    first = searchsorted(rows, rows, side="left")
+    keep = zeros(len(rows), dtype=bool)
+    keep[order] = arange(len(rows)) - first < k
+    return keep
+
+
+def _similar_rows(X, XT, index, threshold, top_k, block_size):
+    """
+    Similarities of the rows `index` of X to every other row, computed
+    `block_size` rows at a time. Returns (rows, cols, data).
+    """
+    rows, cols, data = [zeros(0, dtype=int)], [zeros(0, dtype=int)], [zeros(0)]
+    for start in range(0, len(index), block_size):
+        idx = index[start : start + block_size]
+        block = (X[idx] @ XT).tocoo()  # sorted by row
+        r = idx[block.row]
+        keep = (block.data > threshold) & (r != block.col)
+        local = block.row[keep]
+        r, c, d = r[keep], block.col[keep], block.data[keep]
+        if top_k is not None:
+            # drop everything below the k-th largest value of each row
+            # first, so that only a few entries per row are sorted
+            d_round = d.round(12)
+            ends = cumsum(bincount(local, minlength=len(idx)))
+            kth = full(len(idx), -inf)
+            for i in (diff(ends, prepend=0) > top_k).nonzero()[0]:
+                row = d_round[ends[i - 1] if i else 0 : ends[i]]
+                kth[i] = partition(row, len(row) - top_k)[len(row) - top_k]
+            keep = d_round >= kth[local]
+            r, c, d = r[keep], c[keep], d[keep]
+            keep = _top_k_per_row(r, c, d, top_k)
+            r, c, d = r[keep], c[keep], d[keep]
+        rows.append(r)
+        cols.append(c)
+        data.append(d)
+    return concatenate(rows), concatenate(cols), concatenate(data)
+
+
+def _to_graph(n, rows, cols, data):
+    """Symmetric upper-triangular csr matrix from directed edges"""
+    S = coo_matrix((data, (rows, cols)), shape=(n, n)).tocsr()
+    S = S.maximum(S.T)  # keep the edge if either end selected it
+    return triu(S, k=1).tocsr()
+
+
+def similarity_graph(docs: dict, threshold=0.0, top_k=None, block_size=1024):
+    """
+    Sparse cosine-similarity graph of the tf-idf vectors of `docs`. The
+    similarities are computed `block_size` rows at a time, so the full
+    n x n matrix is never held in memory.
+
+    threshold <float> (0.0): Only keep pairs with a similarity above this
+    top_k <int> (None): Only keep the `top_k` most similar documents of
+        each document. A pair is kept if either document selects the other.
+
+    Returns (keys, S) where S is an upper-triangular csr matrix and S[i, j]
+    is the similarity of keys[i] and keys[j].
+    """
+    keys, X = tfidf_matrix(docs)
+    n = len(keys)
+    if n == 0:
+        return keys, csr_matrix((0, 0))
+    edges = _similar_rows(
+        X, X.T.tocsc(), arange(n), threshold, top_k, block_size
     )
+    return keys, _to_graph(n, *edges)
+
+
+class TfidfIndex:
+    """
+    Keeps the normalised term counts of every document it has seen, so
+    that only documents whose text changed are tokenised again. The last
+    similarity graph is cached as well, and `similarity_graph` only
+    recomputes the rows whose tf-idf vector changed since then.
+
+    Terms which no longer appear in any document are dropped from the
+    vocabulary once they make up half of it (see `_compact`).
+
+    Keys must be hashable and stable (e.g. node ids).
+    """
+
+    def __init__(self):
+        self.vocab = {}  # term -> column
+        self.terms = {}  # key -> (hash of text, columns, counts)
+        self.df = Counter()  # column -> number of documents using it
+        self._graph = None  # see `similarity_graph`
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __contains__(self, key):
+        return key in self.terms
+
+    def update(self, docs: dict):
+        """
+        Indexes the text of each document in `docs` unless it is unchanged.
+        Returns the keys which were (re)tokenised.
+        """
+        hashes = {k: hash(v) for k, v in docs.items()}
+        dirty = {
+            k: docs[k]
+            for k, h in hashes.items()
+            if k not in self.terms or self.terms[k][0] != h
+        }
+        self._forget(dirty)
+        for key, tokens in normalize_many(dirty).items():
+            tf = Counter(
+                self.vocab.setdefault(w, len(self.vocab)) for w in tokens
+            )
+            self.df.update(tf.keys())
+            self.terms[key] = (
+                hashes[key],
+                array(list(tf.keys()), dtype=int),
+                array(list(tf.values()), dtype=float),
+            )
+        self._compact()
+        return list(dirty)
+
+    def remove(self, keys):
+        self._forget(keys)
+        self._compact()
+
+    def _forget(self, keys):
+        for key in keys:
+            if key not in self.terms:
+                continue
+            for c in self.terms.pop(key)[1].tolist():
+                self.df[c] -= 1
+                if not self.df[c]:
+                    del self.df[c]
+
+    def _compact(self):
+        """
+        Renumbers the columns once at least half of the vocabulary is unused.
+        The cached graph refers to the old columns, so it is dropped.
+        """
+        if len(self.df) * 2 > len(self.vocab):
+            return
+        live = array(sorted(self.df), dtype=int)
+        column = full(len(self.vocab), -1)
+        column[live] = arange(len(live))
+        self.vocab = {
+            w: int(column[c]) for w, c in self.vocab.items() if c in self.df
+        }
+        self.terms = {
+            k: (h, column[cols], counts)
+            for k, (h, cols, counts) in self.terms.items()
+        }
+        self.df = Counter({int(column[c]): n for c, n in self.df.items()})
+        self._graph = None
+
+    def prune(self, keep):
+        """Removes every key which is not in `keep` (e.g. tree.registry)"""
+        self.remove([k for k in self.terms if k not in keep])
+
+    def matrix(self, keys):
+        """
+        Same as `tfidf_matrix` for the indexed documents `keys`: documents
+        left without any terms are dropped, and (keys, X) is returned.
+        X has one column per term in the vocabulary, so the columns stay
+        the same from one call to the next.
+        """
+        n = len(keys)
+        terms = [self.terms[k] for k in keys]
+        rows = repeat(arange(n), [len(t[1]) for t in terms])
+        cols = concatenate([zeros(0, dtype=int)] + [t[1] for t in terms])
+        counts = concatenate([zeros(0)] + [t[2] for t in terms])
+        df = bincount(cols, minlength=len(self.vocab))
+        valid = (df >= 2) & (df <= n * 0.8)
+        keep = valid[cols]
+        rows, cols, counts = rows[keep], cols[keep], counts[keep]
+        X = csr_matrix(
+            (counts / df[cols], (rows, cols)), shape=(n, len(self.vocab))
+        )
+        norms = sqrt(X.multiply(X).sum(axis=1)).A1
+        nonempty = (norms > 0).nonzero()[0]
+        keys = [keys[i] for i in nonempty]
+        return keys, diags(1 / norms[nonempty]) @ X[nonempty]
+
+    def similarity_graph(
+        self, docs: dict, threshold=0.0, top_k=None, block_size=1024
+    ):
+        """
+        Same as `nlp.similarity_graph`, but documents are only tokenised
+        if their text changed, and only the rows of the graph affected by
+        a change are recomputed. Calling this again with the same scope and
+        settings reuses the previous graph.
+        """
+        self.update(docs)
+        keys, X = self.matrix(list(docs))
+        n = len(keys)
+        if n == 0:
+            return keys, csr_matrix((0, 0))
+        XT = X.T.tocsc()
+        settings = (keys, threshold, top_k)
+
+        changed = None
+        if self._graph is not None and self._graph[0] == settings:
+            _, old_X, old_edges, S = self._graph
+            old_X = old_X.copy()
+            old_X.resize(X.shape)  # the vocabulary may have grown
+            diff = abs(X - old_X).sum(axis=1).A1
+            changed = (diff > 1e-12).nonzero()[0]
+            if len(changed) == 0:
+                return keys, S
+            if len(changed) > n / 4:
+                changed = None
+
+        if changed is None:
+            edges = _similar_rows(
+                X, XT, arange(n), threshold, top_k, block_size
+            )
+        else:
+            edges = self._patch(
+                X, XT, old_edges, changed, threshold, top_k, block_size
+            )
+        S = _to_graph(n, *edges)
+        self._graph = (settings, X, edges, S)
+        return keys, S
+
+    def _patch(self, X, XT, edges, changed, threshold, top_k, block_size):
+        """
+        Recomputes the directed edges of the graph after the rows `changed`
+        of X were modified. The new similarities of the changed rows are
+        also the new values of the changed columns of every other row. A row
+        which had picked a changed column among its top_k has to be
+        recomputed, since the replacement could be any column. Any other
+        row only has to choose between its previous edges and the new
+        values in the changed columns.
+        """
+        n = X.shape[0]
+        is_changed = zeros(n, dtype=bool)
+        is_changed[changed] = True
+        rows, cols, data = edges
+        new_rows, new_cols, new_data = _similar_rows(
+            X, XT, changed, threshold, None, block_size
+        )
+
+        redo = is_changed.copy()
+        if top_k is not None:
+            redo[rows[is_changed[cols]]] = True
+
+        # unaffected rows keep their edges to unchanged columns ...
+        keep = ~redo[rows] & ~is_changed[cols]
+        rows, cols, data = rows[keep], cols[keep], data[keep]
+        # ... and gain the new values in the changed columns
+        keep = ~redo[new_cols]
+        rows = concatenate([rows, new_cols[keep]])
+        cols = concatenate([cols, new_rows[keep]])
+        data = concatenate([data, new_data[keep]])
+        if top_k is not None:
+            keep = _top_k_per_row(rows, cols, data, top_k)
+            rows, cols, data = rows[keep], cols[keep], data[keep]
+
+        redo_rows = _similar_rows(
+            X, XT, redo.nonzero()[0], threshold, top_k, block_size
+        )
+        return (
+            concatenate([rows, redo_rows[0]]),
+            concatenate([cols, redo_rows[1]]),
+            concatenate([data, redo_rows[2]]),
+        )
 
 
 def levenshtein_distance(s, t):
     """levenshtein_ratio_and_distance:
     Calculates levenshtein distance between two strings.
+    See `edit_distance` for bounded and one-vs-many versions.
     """
-    # Initialize matrix of zeros
-    rows = len(s) + 1
-    cols = len(t) + 1
-    distance = zeros((rows, cols), dtype=int)
-
-    # Populate matrix of zeros with the indeces of each character of both strings
-    for i in range(1, rows):
-        for k in range(1, cols):
-            distance[i][0] = i
-            distance[0][k] = k
-
-    # Iterate over the matrix to compute the cost
-    for col in range(1, cols):
-        for row in range(1, rows):
-            if s[row - 1] == t[col - 1]:
-                cost = 0
-            else:
-                cost = 1
-            distance[row][col] = min(
-                distance[row - 1][col] + 1,  # Cost of deletions
-                distance[row][col - 1] + 1,  # Cost of insertions
-                distance[row - 1][col - 1] + cost,
-            )  # Cost of substitutions
-    return distance[row][col]
+    return levenshtein(s, t)
@@ -0,0 +1,217 @@
+"""
+Entity extraction over the text nodes of a tree.
+
+Instead of joining a whole subtree into one spaCy doc (which runs into
+`nlp.max_length` on large pdfs), every text node is streamed through
+`nlp.pipe`. The entity counts of each text node are stored under
+`node.data["spacy-ents"]`, and every section, pdf and folder in the subtree
+stores the sum of its children's counts.
+
+The outputs for each text node are cached under `node.data["spacy-cache"]`
+together with a hash of its text and the name and version of the pipeline,
+so they are saved with the document. A text node is only parsed again if
+its text or the pipeline changed.
+
+Pipelines are loaded on first use (see `load_pipeline`), and components
+which only feed the token table are disabled while counting entities.
+"""
+
+import threading
+from collections import Counter
+from hashlib import sha1
+
+DEFAULT_MODEL = "en_core_web_sm"
+TOKEN_COLUMNS = ["TEXT", "LEMMA", "POS", "TAG", "DEP"]
+# Components which entity recognition does not depend on
+TOKEN_PIPES = {
+    "tagger",
+    "morphologizer",
+    "attribute_ruler",
+    "lemmatizer",
+    "parser",
+    "senter",
+}
+
+_PIPELINES = {}  # path -> loaded pipeline
+_LOCK = threading.Lock()
+
+
+def load_pipeline(path=DEFAULT_MODEL):
+    """
+    Loads the spaCy pipeline at `path` (a package name or directory) the
+    first time it is requested and returns the same object afterwards. If
+    `prewarm` is still loading it, this waits for it to finish.
+    """
+    with _LOCK:
+        if path not in _PIPELINES:
+            import spacy
+
+            _PIPELINES[path] = spacy.load(path)
+        return _PIPELINES[path]
+
+
+def prewarm(path=DEFAULT_MODEL):
+    """Starts loading `path` in a background thread"""
+
+    def load():
+        try:
+            load_pipeline(path)
+        except Exception:
+            pass  # reported when the pipeline is actually used
+
+    thread = threading.Thread(target=load, daemon=True)
+    thread.start()
+    return thread
+
+
+def entity_pipes(nlp):
+    """The components of `nlp` needed for `doc.ents`"""
+    return [p for p in nlp.pipe_names if p not in TOKEN_PIPES]
+
+
+def node_text(node):
+    return " ".join(
+        str(c["value"]) for c in node.data.get("content") or [] if c["value"]
+    )
+
+
+def text_hash(text):
+    return sha1(text.encode()).hexdigest()
+
+
+def pipeline_id(nlp):
+    """Name and version of the pipeline, e.g. en_core_web_sm-3.7.1"""
+    meta = nlp.meta
+    return f"{meta.get('lang')}_{meta.get('name')}-{meta.get('version')}"
+
+
+def is_cached(node, text, model, tokens=False):
+    """
+    Whether `node` holds the outputs of `model` for `text` (including the
+    token attributes if `tokens`)
+    """
+    cache = node.data.get("spacy-cache") or {}
+    return (
+        cache.get("hash") == text_hash(text)
+        and cache.get("model") == model
+        and "spacy-ents" in node.data
+        and (not tokens or "tokens" in cache)
+    )
+
+
+def store_doc(node, doc, model, tokens=False):
+    """Caches the outputs of `doc` on the text node `node`"""
+    node.data["spacy-ents"] = count_rows(
+        Counter((ent.text, ent.label_) for ent in doc.ents)
+    )
+    cache = {
+        "hash": text_hash(doc.text),
+        "model": model,
+        "vector": doc.vector.tolist() if doc.has_vector else None,
+    }
+    if tokens:
+        cache["tokens"] = [
+            [t.text, t.lemma_, t.pos_, t.tag_, t.dep_] for t in doc
+        ]
+    node.data["spacy-cache"] = cache
+
+
+def token_rows(node):
+    """
+    Cached token attributes of every text node beneath `node`, as rows for
+    the token table
+    """
+    tree = node.controller
+    return [
+        dict(zip(TOKEN_COLUMNS, t))
+        for n in tree.dfs(node.id, types="text")
+        for t in (n.data.get("spacy-cache") or {}).get("tokens", [])
+    ]
+
+
+def count_rows(counts: Counter):
+    """Counter of (text, label) -> rows for the entity table"""
+    rows = [
+        {"Entity": text, "Label": label, "Count": count}
+        for (text, label), count in counts.items()
+    ]
+    rows.sort(key=lambda x: x["Count"], reverse=True)
+    return rows
+
+
+def row_counts(rows):
+    """Inverse of `count_rows`"""
+    return Counter({(r["Entity"], r["Label"]): r["Count"] for r in rows})
+
+
+def aggregate_entities(tree, node_id):
+    """
+    Sets `spacy-ents` of every non-text node beneath (and including)
+    `node_id` to the sum of its children's. Text nodes are left as they are.
+    """
+    counts = {}  # node id -> Counter, until its parent has been summed
+
+    def expand(node):
+        return node.data.get("type") != "text"
+
+    for node in tree.postorder(node_id, expand=expand):
+        if node.data.get("type") == "text":
+            counts[node.id] = row_counts(node.data.get("spacy-ents", []))
+            continue
+        total = Counter()
+        for c in node.data["children"]:
+            total.update(counts.pop(c))
+        node.data["spacy-ents"] = count_rows(total)
+        counts[node.id] = total
+    return counts[node_id]
+
+
+def extract_entities(
+    nlp, node, batch_size=64, n_process=1, tokens=False, callback=None
+):
+    """
+    Runs `nlp` over every text node beneath `node` whose outputs are not
+    cached yet, and stores the entity counts in the subtree (see module
+    docstring).
+
+    batch_size <int> (64): Number of text nodes passed to the pipeline at
+        a time
+    n_process <int> (1): Number of processes used by `nlp.pipe`
+    tokens <bool> (False): Also cache the token attributes (see
+        `token_rows`). Otherwise the components in `TOKEN_PIPES` are
+        disabled.
+    callback <func> (None): Called with (node, doc) for each text node
+        which was parsed
+
+    Returns the entity rows of `node`.
+    """
+    tree = node.controller
+    model = pipeline_id(nlp)
+    todo = []
+    for n in tree.dfs(node.id, types="text"):
+        text = node_text(n)
+        if is_cached(n, text, model, tokens):
+            continue
+        if text:
+            todo.append((text, n.id))
+        else:
+            n.data["spacy-ents"] = []
+            n.data["spacy-cache"] = {
+                "hash": text_hash(text),
+                "model": model,
+                "vector": None,
+                "tokens": [],
+            }
+
+    pipes = nlp.pipe_names if tokens else entity_pipes(nlp)
+    with nlp.select_pipes(enable=pipes):
+        docs = nlp.pipe(
+            todo, as_tuples=True, batch_size=batch_size, n_process=n_process
+        )
+        for doc, node_id in docs:
+            n = tree.registry[node_id]
+            store_doc(n, doc, model, tokens)
+            if callback:
+                callback(n, doc)
+    aggregate_entities(tree, node.id)
+    return node.data["spacy-ents"]
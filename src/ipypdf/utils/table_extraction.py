@@ -1,5 +1,14 @@
+import os
+import time
+import traceback
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
 import numpy as np
+from PIL import Image
 
+from .image_utils import rel_2_pil
 from .tess_utils import im_to_data
 
 
@@ -22,91 +31,95 @@ def grid_detect(
     # use Tesseract to find all words
     df = im_to_data(im, scaling_factor=1)
     boxes = df[["left", "top", "width", "height"]].values
+    grid = boxes_2_grid(
+        boxes, im.size, v_thresh, h_thresh, min_v_gap, min_h_gap
+    )
+    return grid, df
+
+
+def projections(boxes, size):
+    """
+    Number of pixels covered by word boxes along each row (v_density) and
+    each column (h_density) of an image of `size` (w, h).
+
+    Built with difference arrays, so no page sized mask is allocated.
+    """
+    w, h = size
+    x, y, bw, bh = boxes.T
+    x1 = np.clip(x, 0, w)
+    x2 = np.clip(x + bw, 0, w)
+    y1 = np.clip(y, 0, h)
+    y2 = np.clip(y + bh, 0, h)
+
+    rows = np.zeros(h + 1)
+    np.add.at(rows, y1, x2 - x1)
+    np.add.at(rows, y2, x1 - x2)
+
+    cols = np.zeros(w + 1)
+    np.add.at(cols, x1, y2 - y1)
+    np.add.at(cols, x2, y1 - y2)
+    return np.cumsum(rows)[:-1], np.cumsum(cols)[:-1]
+
+
+def bands(density, thresh, min_gap, length):
+    """
+    Finds the spans where `density` exceeds `thresh`. Spans separated by no
+    more than `min_gap` are merged. The spans are then expanded to meet at
+    the midpoint of the gaps between them so that they cover [0, length).
+
+    Returns an array of [start, end] pairs.
+    """
+    above = np.concatenate([[0], density > thresh, [0]]).astype(np.int8)
+    edges = np.diff(above)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    # merge spans separated by small gaps
+    keep = np.concatenate([[True], starts[1:] - ends[:-1] > min_gap])
+    starts = starts[keep]
+    ends = ends[np.concatenate([keep[1:], [True]])]
+
+    # expand to fill
+    mids = (ends[:-1] + starts[1:]) // 2
+    starts = np.concatenate([[0], mids])
+    ends = np.concatenate([mids, [length - 1]])
+    return np.stack([starts, ends], axis=1)
+
+
+def boxes_2_grid(
+    boxes,
+    size,
+    v_thresh=0.05,
+    h_thresh=0.2,
+    min_v_gap=0.05,
+    min_h_gap=2,
+):
+    """
+    Infers the grid of a table from the density of the word boxes.
+    See `grid_detect` for a description of the parameters.
+
+    boxes <np.array>: [left, top, width, height] of each word
+    size <tuple>: (width, height) of the table image
+    """
     avg_word_height = boxes[:, 3].min()
     min_v_gap *= avg_word_height
     min_h_gap *= avg_word_height
-    # min_v_gap = 1
-    # min_h_gap = 1
-    # print(min_h_gap)
-
-    # create a word mask from tesseract bboxes
-    mask = np.zeros(im.size)
-    for bbox in boxes:
-        x, y, w, h = bbox
-        mask[x : x + w, y : y + h] = 1
 
-    v_density = mask.sum(axis=0) / max(mask.sum(axis=0))
-    h_density = mask.sum(axis=1) / max(mask.sum(axis=1))
+    v_density, h_density = projections(boxes, size)
+    v_density = v_density / v_density.max()
+    h_density = h_density / h_density.max()
 
     # scale the density vectors so that the mean is equal to 0.2
     # this makes the thresholds directly related to the average density
     v_density = v_density / (np.mean(v_density) * 4)
     h_density = h_density / (np.mean(h_density) * 4)
 
-    # move down the image and record spans which exceed the threshold for being considered a row
-    grid_y = []
-    to_del = set()
-    y = 0
-    out = True
-    for y, val in enumerate(v_density):
-        if val > v_thresh and out:
-            out = False
-            if len(grid_y) == 0 or y - grid_y[-1][-1] > min_v_gap:
-                grid_y.append([y])
-            else:
-                grid_y[-1] = [grid_y[-1][0]]
-        if val < v_thresh and not out:
-            grid_y[-1].append(y)
-            out = True
-        if not out:  # inside of a peak
-            if val > 1.5:
-                to_del.add(len(grid_y) - 1)
-
-    # expand to fill
-    grid_y[0][0] = 0
-    grid_y[-1][1] = im.size[1] - 1
-    for i in range(len(grid_y) - 1):
-        x1 = grid_y[i][1]  # end of this
-        x2 = grid_y[i + 1][0]  # begining of next
-        m = int((x1 + x2) / 2)
-        grid_y[i][1] = m
-        grid_y[i + 1][0] = m
-
-    grid_x = []
-    to_del = set()
-    x = 0
-    out = True
-    for x, val in enumerate(h_density):
-        if val > h_thresh and out:
-            out = False
-            if len(grid_x) == 0 or x - grid_x[-1][-1] > min_h_gap:
-                grid_x.append([x])
-            else:
-                grid_x[-1] = [grid_x[-1][0]]
-        if not val > h_thresh and not out:
-            grid_x[-1].append(x)
-            out = True
-        if not out:  # inside of a peak
-            if val > 1.5:
-                to_del.add(len(grid_x) - 1)
-
-    # expand to fill
-    grid_x[0][0] = 0
-    grid_x[-1][1] = im.size[0] - 1
-    for i in range(len(grid_x) - 1):
-        x1 = grid_x[i][1]  # end of this
-        x2 = grid_x[i + 1][0]  # begining of next
-        m = int((x1 + x2) / 2)
-        grid_x[i][1] = m
-        grid_x[i + 1][0] = m
+    grid_y = bands(v_density, v_thresh, min_v_gap, size[1])
+    grid_x = bands(h_density, h_thresh, min_h_gap, size[0])
 
-    grid = []
-    for y in grid_y:
-        y1, y2 = y
-        for x in grid_x:
-            x1, x2 = x
-            grid.append([x1, y1, x2 - x1, y2 - y1])
-    return grid, df
+    y1, y2 = np.repeat(grid_y, len(grid_x), axis=0).T
+    x1, x2 = np.tile(grid_x, (len(grid_y), 1)).T
+    return np.stack([x1, y1, x2 - x1, y2 - y1], axis=1).tolist()
 
 
 def contains(coords1, coords2):
@@ -118,13 +131,37 @@ def contains(coords1, coords2):
 
 
 def grid_2_table(grid, df=None):
+    """
+    Places the words in `df` into the cells of `grid` (row-major list of
+    [x, y, w, h] cells as returned by `grid_detect`). A word belongs to the
+    cell which contains its centre (see `contains`).
+
+    The row and column of each word are looked up with `np.searchsorted`
+    over the cell edges instead of testing every word against every cell.
+    """
+    grid = np.asarray(grid)
+    n = len(set(grid[:, 0].tolist()))
+    col_x1 = grid[:n, 0]
+    col_x2 = col_x1 + grid[:n, 2]
+    row_y1 = grid[::n, 1]
+    row_y2 = row_y1 + grid[::n, 3]
+
+    boxes = df[["left", "top", "width", "height"]].values
+    px = boxes[:, 0] + boxes[:, 2] / 2
+    py = boxes[:, 1] + boxes[:, 3] / 2
+
+    # index of the last edge strictly left of (above) the centre
+    col = np.searchsorted(col_x1, px, side="left") - 1
+    row = np.searchsorted(row_y1, py, side="left") - 1
+    inside = (col >= 0) & (row >= 0)
+    col = col.clip(0)
+    row = row.clip(0)
+    inside &= (px < col_x2[col]) & (py < row_y2[row])
+
     cells = [[""] for cell in grid]
-    for i, bbox in enumerate(df[["left", "top", "width", "height"]].values):
-        text = df["text"][i]
-        for j, cell in enumerate(grid):
-            if contains(cell, bbox):
-                cells[j].append(text)
-    n = len(set([x[0] for x in grid]))
+    index = row[inside] * n + col[inside]
+    for j, text in zip(index, df["text"].values[inside]):
+        cells[j].append(text)
     cells = [" ".join(x) for x in cells]
     return [cells[i : i + n] for i in range(0, len(cells), n)]
 
@@ -132,3 +169,153 @@ def grid_2_table(grid, df=None):
 def img_2_table(im):
     grid, df = grid_detect(im)
     return grid_2_table(grid, df)
+
+
+def rule_positions(lines, ink, min_cell=8):
+    """
+    lines <np.array>: projection of the rule mask onto one axis
+    ink <np.array>: projection of everything else (i.e. text) onto that axis
+
+    Returns the cell boundaries (centre of each rule) along the axis. The
+    image edges are used as boundaries when there is text beyond the
+    outermost rules, i.e. the table has no outer border. Boundaries closer
+    than `min_cell` pixels are merged.
+    """
+    length = len(lines)
+    on = np.concatenate([[0], lines > 0, [0]]).astype(np.int8)
+    edges = np.diff(on)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if len(starts) == 0:
+        return np.array([0, length - 1])
+
+    bounds = (starts + ends - 1) // 2
+    if ink[: max(starts[0] - 1, 0)].any():
+        bounds = np.concatenate([[0], bounds])
+    if ink[ends[-1] + 1 :].any():
+        bounds = np.concatenate([bounds, [length - 1]])
+    keep = np.concatenate([[True], np.diff(bounds) >= min_cell])
+    return bounds[keep]
+
+
+def rule_masks(im, min_line=0.3):
+    """
+    Separates the rules of a table from everything else using
+    morphological opening.
+
+    Returns (binary, horizontal, vertical) masks of the image, of all dark
+    pixels and of the horizontal and vertical rules.
+    """
+    gray = cv2.cvtColor(np.array(im.convert("RGB")), cv2.COLOR_RGB2GRAY)
+    binary = cv2.adaptiveThreshold(
+        ~gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 15, -2
+    )
+    h, w = binary.shape
+
+    h_kernel = cv2.getStructuringElement(
+        cv2.MORPH_RECT, (max(int(w * min_line), 1), 1)
+    )
+    v_kernel = cv2.getStructuringElement(
+        cv2.MORPH_RECT, (1, max(int(h * min_line), 1))
+    )
+    horizontal = cv2.morphologyEx(binary, cv2.MORPH_OPEN, h_kernel)
+    vertical = cv2.morphologyEx(binary, cv2.MORPH_OPEN, v_kernel)
+    return binary, horizontal, vertical
+
+
+def ruled_grid_detect(im, min_line=0.3, min_cell=8, masks=None):
+    """
+    Finds the grid of a table drawn with horizontal and vertical rules.
+    Returns None unless both horizontal and vertical rules are found.
+
+    im <PIL.Image>: Image of a table
+    min_line <float> (0.3): Shortest segment, as a fraction of the table's
+        width (or height), which is considered a rule
+    min_cell <int> (8): Smallest cell size in pixels
+    masks <tuple> (None): The output of `rule_masks(im, min_line)` if it
+        has already been computed
+    """
+    if masks is None:
+        masks = rule_masks(im, min_line)
+    binary, horizontal, vertical = masks
+
+    if not horizontal.any() or not vertical.any():
+        return None
+
+    ink = binary & ~horizontal & ~vertical
+    ys = rule_positions(horizontal.sum(axis=1), ink.sum(axis=1), min_cell)
+    xs = rule_positions(vertical.sum(axis=0), ink.sum(axis=0), min_cell)
+    if len(ys) < 2 or len(xs) < 2:
+        return None
+
+    grid = []
+    for y1, y2 in zip(ys[:-1], ys[1:]):
+        for x1, x2 in zip(xs[:-1], xs[1:]):
+            grid.append([int(x1), int(y1), int(x2 - x1), int(y2 - y1)])
+    return grid
+
+
+def ruled_img_2_table(im):
+    """
+    Builds a table from the rules drawn in the image, then reads the whole
+    table with a single Tesseract pass and places each word in the cell
+    containing its centre (see `grid_2_table`). The rules are erased
+    before OCR so they are not read as characters. Falls back to
+    `img_2_table` when the table has no rules.
+    """
+    masks = rule_masks(im)
+    grid = ruled_grid_detect(im, masks=masks)
+    if grid is None:
+        return img_2_table(im)
+    _, horizontal, vertical = masks
+    clean = np.array(im.convert("RGB"))
+    clean[(horizontal > 0) | (vertical > 0)] = 255
+    df = im_to_data(Image.fromarray(clean), scaling_factor=1)
+    return grid_2_table(grid, df)
+
+
+def _timed(engine, key, im):
+    start = time.perf_counter()
+    try:
+        rows, error = engine(im), None
+    except Exception:
+        rows, error = None, traceback.format_exc()
+    return key, {
+        "rows": rows,
+        "seconds": time.perf_counter() - start,
+        "error": error,
+    }
+
+
+def parse_tables(imgs, jobs, engine=img_2_table, max_workers=None):
+    """
+    Parses many tables from the same document. Each page is rendered once
+    and the crops of all tables on it are handed to a pool of workers.
+
+    imgs <ImageContainer>: Pages of the document
+    jobs <list>: (key, page, rel_coords) of each table
+    engine <func> (img_2_table): Converts a cropped table into rows. It
+        should run its OCR in the calling thread (both engines here run a
+        single Tesseract process per table), so that `max_workers` bounds
+        the number of Tesseract processes.
+    max_workers <int> (None): Number of tables parsed at once. Defaults
+        to the number of cpus. Tesseract builds with OpenMP also use
+        several threads per process; set `OMP_THREAD_LIMIT=1` to prevent
+        them from oversubscribing the cpus.
+
+    Returns {key: {"rows", "seconds", "error"}}. A table which fails does
+    not stop the others; its traceback is stored under "error".
+    """
+    by_page = defaultdict(list)
+    for key, page, coords in jobs:
+        by_page[page].append((key, coords))
+
+    futures = []
+    max_workers = max_workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for page in sorted(by_page):
+            img = imgs[page]
+            for key, coords in by_page[page]:
+                crop = img.crop(rel_2_pil(coords, img.width, img.height))
+                futures.append(pool.submit(_timed, engine, key, crop))
+        return dict(f.result() for f in futures)
@@ -0,0 +1,210 @@
+"""
+Parsed tables are stored as parquet files next to the pdf they came from
+(`<pdf stem>_tables/<node id>.parquet`) instead of nested lists inside the
+json. The node only keeps the relative path under `data["table_file"]`, and
+the DataFrame is read the first time the table is requested.
+
+Nodes which still have rows under `data["table"]` (e.g. straight from the
+layout parser) are converted when the document is saved, and side files of
+table nodes which no longer exist are removed.
+
+Cells are stored as the text that was read, so leading zeros, currency
+symbols and separators are kept. Numeric columns are parsed on demand with
+`typed_frame`.
+"""
+
+import re
+from weakref import WeakKeyDictionary
+
+import numpy as np
+import pandas as pd
+
+from .tree_utils import file_path
+
+_FRAMES = WeakKeyDictionary()  # node -> DataFrame
+_NUMBER = re.compile(r"^\(?-?[$€£]?\s*[\d,]*\.?\d+\)?$")
+
+
+def _unique(names):
+    """Parquet requires unique string column names"""
+    seen = set()
+    result = []
+    for name in names:
+        name = base = str(name).strip()
+        i = 0
+        while name in seen:  # e.g. "a", "a", "a.1"
+            i += 1
+            name = f"{base}.{i}"
+        seen.add(name)
+        result.append(name)
+    return result
+
+
+def _to_number(value):
+    negative = value.startswith("(") and value.endswith(")")
+    value = re.sub(r"[()$€£,\s]", "", value)
+    return -float(value) if negative else float(value)
+
+
+def typed_column(values: pd.Series):
+    """
+    Parses a column of strings as floats if every non-empty cell is a
+    number (allowing currency symbols, thousands separators and negatives
+    written in parentheses). Otherwise the column is returned unchanged.
+    """
+    filled = values[values != ""]
+    if len(filled) == 0 or not filled.str.match(_NUMBER).all():
+        return values
+    return values.map(lambda x: _to_number(x) if x else None).astype(float)
+
+
+def typed_frame(df):
+    """Copy of a stored table with its numeric columns parsed as floats"""
+    df = df.copy()
+    for c in df.columns:
+        df[c] = typed_column(df[c])
+    return df
+
+
+def rows_2_frame(rows):
+    """
+    rows <list[list[str]]>: A table as returned by `img_2_table`. The first
+        row is used as the header.
+
+    Returns a DataFrame of strings (see `typed_frame` for numbers).
+    """
+    if not rows:
+        return pd.DataFrame()
+    df = pd.DataFrame(
+        [[str(x).strip() if x is not None else "" for x in r] for r in rows]
+    )
+    df = df.fillna("")
+    header = df.iloc[0]
+    df = df.iloc[1:].reset_index(drop=True)
+    df.columns = _unique(header)
+    return df
+
+
+def _pdf_dir(node):
+    return file_path(node).parent
+
+
+def table_path(node):
+    pdf = file_path(node)
+    return pdf.parent / f"{pdf.stem}_tables" / f"{node.id}.parquet"
+
+
+def set_table(node, rows):
+    """Stores `rows` for `node` as a parquet side file"""
+    df = rows_2_frame(rows)
+    path = table_path(node)
+    path.parent.mkdir(exist_ok=True)
+    df.to_parquet(path, index=False)
+    node.data["table_file"] = path.relative_to(_pdf_dir(node)).as_posix()
+    node.data.pop("table", None)
+    _FRAMES[node] = df
+    return df
+
+
+def get_table(node):
+    """
+    Returns the table of `node` as a DataFrame (or None if it has not been
+    parsed). The side file is only read the first time.
+    """
+    if node in _FRAMES:
+        return _FRAMES[node]
+    if node.data.get("table_file"):
+        df = pd.read_parquet(_pdf_dir(node) / node.data["table_file"])
+    elif node.data.get("table"):
+        df = rows_2_frame(node.data["table"])
+    else:
+        return None
+    _FRAMES[node] = df
+    return df
+
+
+def store_tables(node):
+    """
+    Moves any tables beneath `node` which are still stored as rows into
+    side files, and removes the side files of deleted tables from the pdfs
+    beneath `node` (see `remove_stale_tables`).
+    """
+    tree = node.controller
+    for n in tree.dfs(node.id):
+        if n.data.get("table"):
+            set_table(n, n.data["table"])
+    for pdf in tree.dfs(node.id, types="pdf"):
+        remove_stale_tables(pdf)
+
+
+def remove_stale_tables(pdf):
+    """
+    Deletes the side files in the `_tables` folder of the pdf node `pdf`
+    which don't belong to one of its table nodes. This runs when the
+    document is saved, so the side files always match the saved json.
+    """
+    tree = pdf.controller
+    path = file_path(pdf)
+    folder = path.parent / f"{path.stem}_tables"
+    if not folder.is_dir():
+        return
+    keep = {
+        f"{n.id}.parquet"
+        for n in tree.dfs(pdf.id, types="table")
+        if n.data.get("table_file")
+    }
+    for f in folder.glob("*.parquet"):
+        if f.name not in keep:
+            f.unlink()
+
+
+def export_tables(tree, path, node_id="root"):
+    """
+    Writes every table beneath `node_id` to a single long-format dataset
+    with one row per cell. `value` holds the cell text and `number` the
+    numeric value for numeric columns. The format follows the suffix of
+    `path` (.parquet or .csv).
+    """
+    frames = []
+    for node in tree.dfs(node_id, types="table"):
+        df = get_table(node)
+        if df is None or df.empty:
+            continue
+        # built from positions, so headers like "row" or "value" are fine
+        n_rows, n_cols = df.shape
+        numbers = typed_frame(df)
+        numbers = [
+            (
+                numbers.iloc[:, i].to_numpy(float)
+                if numbers.iloc[:, i].dtype == float
+                else np.full(n_rows, np.nan)
+            )
+            for i in range(n_cols)
+        ]
+        long = pd.DataFrame(
+            {
+                "row": np.tile(np.arange(n_rows), n_cols),
+                "column": np.repeat(np.arange(n_cols), n_rows),
+                "header": np.repeat(np.array(df.columns, object), n_rows),
+                "value": df.to_numpy(dtype=object).T.ravel(),
+                "number": np.concatenate(numbers),
+            }
+        )
+        content = node.data.get("content") or [{}]
+        long.insert(0, "page", content[0].get("page"))
+        long.insert(0, "label", node.data.get("label", ""))
+        long.insert(0, "node_id", node.id)
+        long.insert(0, "pdf", str(file_path(node)))
+        frames.append(long)
+
+    columns = ["pdf", "node_id", "label", "page", "row", "column", "header"]
+    if frames:
+        result = pd.concat(frames, ignore_index=True)
+    else:
+        result = pd.DataFrame(columns=columns + ["value", "number"])
+    result = result[columns + ["value", "number"]]
+    if str(path).lower().endswith(".csv"):
+        result.to_csv(path, index=False)
+    else:
+        result.to_parquet(path, index=False)
+    return result
@@ -114,13 +114,17 @@ def im_to_data(im, scaling_factor=1):
     return df
 
 
-def get_ocr_data(path):
+def get_ocr_data(path, imgs=None):
     """
     This is almost identical to tessdata_to_df
     TODO: merge the two functions into one
+
+    imgs <ImageContainer> (None): Pages which have already been rendered.
+        The pdf at `path` is rendered page by page if not provided.
     """
-    imgs = ImageContainer(path, bulk_render=False)
-    for i in range(imgs.info["Pages"]):
+    if imgs is None:
+        imgs = ImageContainer(path, bulk_render=False)
+    for i in range(len(imgs)):
         img = imgs[i]
         # Pass full page into Tesseract
         data = tess.image_to_data(img, config="--psm 1")
@@ -142,11 +146,11 @@ def get_ocr_data(path):
         yield df.reset_index()
 
 
-def get_text_blocks(path):
+def get_text_blocks(path, imgs=None):
     """
     Used to extract text from images
     """
-    for df in get_ocr_data(path):
+    for df in get_ocr_data(path, imgs):
         groups = df.groupby(by="block_num").groups
         # print(groups.groups)
         keys = sorted(list(groups.keys()))
@@ -172,3 +176,39 @@ def get_text_blocks(path):
                 }
             )
         yield text_blocks
+
+
+def words_in_boxes(df, rel_boxes, w, h):
+    """
+    Assigns each word in `df` (as returned by `im_to_data`) to the box
+    which contains its centre. If several boxes contain the word, the
+    smallest one wins. Words keep the reading order produced by Tesseract.
+
+    rel_boxes <list>: relative coordinates [x1, x2, y1, y2] of each box
+    w, h <int>: Size of the image `df` was extracted from
+
+    Returns a list with the joined text of each box.
+    """
+    if len(rel_boxes) == 0:
+        return []
+    boxes = np.asarray(rel_boxes, dtype=float)
+    if len(df) == 0:
+        return [""] * len(boxes)
+    cx = (df["left"].values + df["width"].values / 2) / w
+    cy = (df["top"].values + df["height"].values / 2) / h
+
+    x1, x2, y1, y2 = (boxes[:, i, None] for i in range(4))
+    inside = (x1 <= cx) & (cx <= x2) & (y1 <= cy) & (cy <= y2)
+
+    # Mask out non-containing boxes with an infinite area, then pick the
+    # smallest remaining box for each word
+    area = ((x2 - x1) * (y2 - y1)).repeat(len(cx), axis=1)
+    area[~inside] = np.inf
+    owner = area.argmin(axis=0)
+    owner[~inside.any(axis=0)] = -1
+
+    words = [[] for _ in boxes]
+    for i, text in zip(owner, df["text"].values):
+        if i >= 0:
+            words[i].append(text)
+    return [" ".join(x) for x in words]
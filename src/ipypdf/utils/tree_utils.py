@@ -1,6 +1,8 @@
 import json
 from pathlib import Path
 
+from .nlp import TfidfIndex
+
 
 def file_path(node):
     if node.id == "root":
@@ -16,13 +18,22 @@ def file_path(node):
 
 
 def stringify(node):
-    result = []
-    tree = node.controller
-    for n in tree.dfs(node.id):
-        if n.data.get("type", None) == "text":
-            for c in n.data["content"]:
-                result.append(c["value"])
-    return " ".join(result)
+    """
+    Text beneath `node` (see `Tree.subtree_text`). Edit content with
+    `Tree.set_content` so that this stays current.
+    """
+    return node.controller.subtree_text(node)
+
+
+def tfidf_index(tree):
+    """
+    The `TfidfIndex` of `tree`, keyed by node id. It is created on first use
+    and forgets any nodes which have since been removed from the tree.
+    """
+    if getattr(tree, "tfidf_index", None) is None:
+        tree.tfidf_index = TfidfIndex()
+    tree.tfidf_index.prune(tree.registry)
+    return tree.tfidf_index
 
 
 def select(node, goto=True):
@@ -32,12 +43,11 @@ def select(node, goto=True):
 
 def _natural_path_backwards(node):
     tree = node.controller
-    if node.data["type"] == "pdf":
-        return [node.data["label"]]
-    else:
-        return [node.data.get("label", "")] + _natural_path_backwards(
-            tree.parent_of(node)
-        )
+    path = []
+    while node.data["type"] != "pdf":
+        path.append(node.data.get("label", ""))
+        node = tree.parent_of(node)
+    return path + [node.data["label"]]
 
 
 def natural_path(node):
@@ -1,7 +1,10 @@
 # Author: Joel Stansbury
 # Email: stansbury.joel@gmail.com
 
+import sys
 import time
+from collections import deque
+from contextlib import contextmanager
 from pathlib import Path
 from typing import List, Union
 from uuid import uuid1
@@ -10,8 +13,7 @@ import ipywidgets as ipyw
 from ipyevents import Event
 from traitlets import Int, Unicode, link, observe
 
-CSS = ipyw.HTML(
-    """
+CSS = ipyw.HTML("""
     <style>
         .better-tree-btn {
             background: transparent;
@@ -46,8 +48,7 @@ CSS = ipyw.HTML(
             width: 16px;
         }
     </style>
-    """
-)
+    """)
 
 
 ICONS = {
@@ -72,12 +73,159 @@ ICONS = {
 }
 
 
+class ChildList(list):
+    """
+    The ids of a node's children. Behaves like (and serialises as) a plain
+    list, but keeps an id -> position index so that `in`, `index` and
+    `remove` don't have to scan the children of nodes with thousands of
+    them. Ids must be unique.
+
+    Inserting or removing an id shifts the positions behind it. Those are
+    only re-indexed when one of them is looked up with `index`.
+    """
+
+    _index = None  # id -> position, built on first use
+    _valid = 0  # positions below this are up to date
+
+    def _positions(self):
+        if self._index is None:
+            self._index = dict(zip(self, range(len(self))))
+            self._valid = len(self)
+        return self._index
+
+    def _lookup(self, x):
+        """Position of `x` if its indexed position is still correct"""
+        i = self._positions().get(x)
+        if i is not None and i < len(self) and self[i] == x:
+            return i
+        return None
+
+    def _shifted(self, i):
+        """Positions from `i` on have moved"""
+        self._valid = min(self._valid, i)
+
+    def _reset(self):
+        self._index = None
+        self._valid = 0
+
+    def __contains__(self, x):
+        return x in self._positions()
+
+    def index(self, x, *args):
+        if args:
+            return super().index(x, *args)
+        i = self._lookup(x)
+        if i is not None:
+            return i
+        if x not in self._positions():
+            raise ValueError(f"{x!r} is not in list")
+        tail = range(self._valid, len(self))
+        self._index.update(zip(self[self._valid :], tail))
+        self._valid = len(self)
+        return self._index[x]
+
+    def append(self, x):
+        if self._index is not None:
+            if self._valid == len(self):
+                self._valid += 1
+            self._index[x] = len(self)
+        super().append(x)
+
+    def extend(self, ids):
+        for x in ids:
+            self.append(x)
+
+    def __iadd__(self, ids):
+        self.extend(ids)
+        return self
+
+    def insert(self, i, x):
+        n = len(self)
+        i = min(max(i + n if i < 0 else i, 0), n)
+        super().insert(i, x)
+        if self._index is not None:
+            self._index[x] = i
+            self._shifted(i)
+
+    def remove(self, x):
+        i = self._lookup(x)
+        if i is None:
+            # A scan is cheaper than re-indexing everything behind the
+            # last change (e.g. when the children are moved away one by one)
+            i = super().index(x)
+        del self[i]
+
+    def pop(self, i=-1):
+        if i < 0:
+            i += len(self)
+        x = super().pop(i)
+        if self._index is not None:
+            self._index.pop(x, None)
+            self._shifted(i)
+        return x
+
+    def __delitem__(self, i):
+        if isinstance(i, int) and self._index is not None:
+            self.pop(i)
+        else:
+            super().__delitem__(i)
+            self._reset()
+
+    def clear(self):
+        super().clear()
+        self._reset()
+
+    def __setitem__(self, i, x):
+        super().__setitem__(i, x)
+        self._reset()
+
+    def __imul__(self, n):
+        result = super().__imul__(n)
+        self._reset()
+        return result
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._reset()
+
+    def reverse(self):
+        super().reverse()
+        self._reset()
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
 class Node:
+    # A corpus holds millions of nodes, so they don't get an instance
+    # dict. `__weakref__` is needed by the table cache in table_store.
+    __slots__ = (
+        "data",
+        "id",
+        "parent",
+        "level",
+        "controller",
+        "opened",
+        "selected",
+        "__weakref__",
+    )
+
     def __init__(self, data):
         self.data = data if data else {}
-        self.data["children"] = self.data.get("children", [])
-        self.id = self.data.get("id", str(uuid1()))
-        # self.parent = self.data.get("parent", None)
+        # The ids in children lists and the few distinct types are shared
+        # with the nodes instead of being copies from the json
+        self.data["children"] = ChildList(
+            map(_intern, self.data.get("children", []))
+        )
+        if "type" in self.data:
+            self.data["type"] = _intern(self.data["type"])
+        self.id = _intern(self.data.get("id", str(uuid1())))
+        if "id" in self.data:
+            self.data["id"] = self.id
+        self.parent = None
+        self.level = None  # set by the Tree
+        self.controller = None
         self.opened = False
         self.selected = False
 
@@ -105,6 +253,11 @@ class Tree:
         self.listeners = []
         self.widget = None
         self.onchange_todos = []
+        # node id -> (text, number of text values, number of tokens) of the
+        # subtree. If a node is cached, so is every node beneath it.
+        self._text_cache = {}
+        self._batch_depth = 0  # see `batch`
+        self._touched = set()
 
         if nodes:
             self.add_multiple(nodes)
@@ -113,6 +266,8 @@ class Tree:
         if node.parent is not None:
             old_parent = self.registry[node.parent]
             old_parent.data["children"].remove(node.id)
+            self._invalidate(old_parent.id)
+            self._touch(old_parent.id, node.id)
         node.parent = None
 
     def _set_parent(self, node, parent, position=None):
@@ -121,9 +276,72 @@ class Tree:
         else:
             parent.data["children"].insert(position, node.id)
         node.parent = parent.id
+        self._set_depth(node, parent.level + 1)
+        self._invalidate(parent.id)
+        self._touch(parent.id, node.id)
+
+    def _touch(self, *node_ids):
+        """Remembers nodes to validate at the end of a `batch`"""
+        if self._batch_depth:
+            self._touched.update(node_ids)
+
+    def _invalidate(self, node_id):
+        """Drops the cached subtree text of `node_id` and its ancestors"""
+        while node_id in self._text_cache:
+            del self._text_cache[node_id]
+            node_id = getattr(self.registry[node_id], "parent", None)
+
+    def _subtree_text(self, node_id):
+        if node_id in self._text_cache:
+            return self._text_cache[node_id]
+        cache = self._text_cache
+
+        # cached subtrees are complete, so there is no need to enter them
+        def expand(node):
+            return node.id not in cache
+
+        for node in self.postorder(node_id, expand=expand):
+            if node.id in cache:
+                continue
+            parts = []
+            if node.data.get("type") == "text":
+                parts = [c["value"] or "" for c in node.data["content"]]
+            n_values = len(parts)
+            n_tokens = sum(len(x.split()) for x in parts)
+            for c in node.data["children"]:
+                text, n, t = cache[c]
+                if n:
+                    parts.append(text)
+                    n_values += n
+                    n_tokens += t
+            cache[node.id] = (" ".join(parts), n_values, n_tokens)
+        return cache[node_id]
+
+    def subtree_text(self, node: Union[str, Node] = "root"):
+        """
+        The content of every text node beneath (and including) `node`
+        joined by spaces, in depth first order. The result is cached until
+        the subtree changes, so content edited in place without calling
+        `set_content` or `update` is not seen.
+        """
+        return self._subtree_text(self._handle_type(node).id)[0]
 
-    def _validate(self):
-        for id, node in self.registry.items():
+    def subtree_token_count(self, node: Union[str, Node] = "root"):
+        """Number of whitespace separated tokens in `subtree_text(node)`"""
+        return self._subtree_text(self._handle_type(node).id)[2]
+
+    def _validate(self, node_ids=None):
+        """
+        node_ids <iterable[str]> (None): Only check these nodes (if they
+            are still in the tree). Checks every node when None.
+        """
+        if node_ids is None:
+            nodes = self.registry.items()
+        else:
+            nodes = [
+                (i, self.registry[i]) for i in node_ids if i in self.registry
+            ]
+        for id, node in nodes:
             for c in node.data["children"]:
                 assert (
                     c in self.registry
@@ -133,19 +351,32 @@ class Tree:
                     + f"Should be: {self.registry[id]}"
                 )
 
-        for id, node in self.registry.items():
+        for id, node in nodes:
             if id != "root":
                 assert id in self.registry[node.parent].data["children"]
 
     def _compute_depth(self, node_id="root", level=0):
-        # TODO: Collect some statistics about this. It may actually
-        # be more efficient to recompute the depth for the 20
-        # visible nodes everytime, versus computing all depths
-        # on an alteration
-        node = self.registry[node_id]
-        node.level = level
-        for c in node.data["children"]:
-            self._compute_depth(c, level + 1)
+        """
+        Sets the depth of every node beneath `node_id`. Mutations only
+        update the subtree they touch (see `_set_depth`), which
+        _scripts/bench_tree_depth.py measures against calling this after
+        every mutation.
+        """
+        stack = [(node_id, level)]
+        while stack:
+            node_id, level = stack.pop()
+            node = self.registry[node_id]
+            node.level = level
+            stack += [(c, level + 1) for c in node.data["children"]]
+
+    def _set_depth(self, node, level):
+        """
+        Sets the depth of `node` and its subtree. The subtree is only
+        visited if the depth of `node` actually changed.
+        """
+        if node.level == level:
+            return
+        self._compute_depth(node.id, level)
 
     def onchange(self, function):
         self.onchange_todos.append(function)
@@ -164,9 +395,40 @@ class Tree:
     def _housekeeping(self):
         # self._validate()
         # self._set_controller()
-        self._compute_depth()
+        if self._batch_depth:
+            return  # deferred until the end of the batch
         self._do_onchange()
 
+    @contextmanager
+    def batch(self, validate=True):
+        """
+        Groups several mutations so that listeners (including the
+        `TreeWidget`) are only notified once, when the outermost batch
+        ends, instead of after every mutation.
+
+            with tree.batch():
+                for node in nodes:
+                    tree.move(node, parent)
+
+        validate <bool> (True): Check the parent/children links of every
+            node touched by the batch once it ends. Skipped if the batch
+            raised, so that the original exception is the one reported.
+        """
+        self._batch_depth += 1
+        completed = False
+        try:
+            yield self
+            completed = True
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                touched, self._touched = self._touched, set()
+                try:
+                    if validate and completed:
+                        self._validate(touched)
+                finally:
+                    self._do_onchange()
+
     def _handle_type(self, node: Union[str, Node, dict], allow_creation=False):
         if isinstance(node, str):
             return self.registry[node]
@@ -194,8 +456,7 @@ class Tree:
         self._housekeeping()
 
     def get_depth(self, node):
-        node = self._handle_type(node)
-        return node.parent.level + 1
+        return self._handle_type(node).level
 
     def add_multiple(
         self,
@@ -208,29 +469,52 @@ class Tree:
         directly beneath `parent` (default: 'root').
 
         every node in `node_list` is required to have a 'children' attribute
-        """
-        parent = self._handle_type(parent)
-        node_list = [
-            self._handle_type(node, allow_creation=True) for node in node_list
-        ]
-
-        ids = set([x.id for x in node_list])
-        children = set(sum([x.data["children"] for x in node_list], []))
-        orphans = ids - children
-
-        for n in node_list:  # preserve the order of node_list
-            if n.id in orphans:
-                parent.data["children"].append(n.id)
-
-        for node in node_list:
-            node.parent = parent.id
-            node.controller = self
-            self.registry[node.id] = node
 
-        for id, node in self.registry.items():
-            for c in node.data["children"]:
-                self.registry[c].parent = id
-        self._housekeeping()
+        Nodes which are already in the tree (in `node_list` or listed as a
+        child) are moved, i.e. removed from their previous parent.
+        """
+        # The links are set from the nodes' own children lists below, so
+        # they are consistent and not validated
+        with self.batch(validate=False):
+            parent = self._handle_type(parent)
+            node_list = [
+                self._handle_type(node, allow_creation=True)
+                for node in node_list
+            ]
+
+            ids = set([x.id for x in node_list])
+            children = {c for x in node_list for c in x.data["children"]}
+            orphans = ids - children
+
+            for node in node_list:
+                if node.id in self.registry:
+                    self._disown(node)
+            for node in node_list:
+                for c in node.data["children"]:
+                    if c not in ids and self.registry[c].parent != node.id:
+                        self._disown(self.registry[c])
+
+            for n in node_list:  # preserve the order of node_list
+                if n.id in orphans:
+                    parent.data["children"].append(n.id)
+
+            for node in node_list:
+                node.parent = parent.id
+                node.controller = self
+                self.registry[node.id] = node
+
+            # Only the new nodes can have new children, so there is no need
+            # to revisit the rest of the registry
+            for node in node_list:
+                for c in node.data["children"]:
+                    self.registry[c].parent = node.id
+            # this also reaches the existing nodes listed as children
+            for node in node_list:
+                if node.id in orphans:
+                    self._compute_depth(node.id, parent.level + 1)
+            self._invalidate(parent.id)
+            self._touch(parent.id, *ids)
+            self._housekeeping()
 
     def move(
         self,
@@ -260,22 +544,21 @@ class Tree:
         children_key: str = "children",
     ):
         # node_data['parent'] = parent_id
-        if children_key in node_data:
-            children_list = node_data.pop(children_key)
-        else:
-            children_list = []
-        node_data["children"] = []
-        node = Node(node_data)  # get or create node.id
-        node.parent = parent_id
-        node.controller = self
-        self.registry[parent_id].data["children"].append(node.id)
-        self.registry[node.id] = node
-        for child in children_list:
-            self._insert_nested_dict(
-                child,
-                parent_id=node.id,
-                children_key=children_key,
-            )
+        stack = [(node_data, parent_id)]
+        while stack:
+            node_data, parent_id = stack.pop()
+            if children_key in node_data:
+                children_list = node_data.pop(children_key)
+            else:
+                children_list = []
+            node_data["children"] = []
+            node = Node(node_data)  # get or create node.id
+            node.parent = parent_id
+            node.controller = self
+            node.level = self.registry[parent_id].level + 1
+            self.registry[parent_id].data["children"].append(node.id)
+            self.registry[node.id] = node
+            stack.extend((c, node.id) for c in reversed(children_list))
 
     def insert_nested_dicts(
         self,
@@ -291,6 +574,7 @@ class Tree:
                 children_key=children_key,
                 parent_id=parent_id,
             )
+        self._invalidate(parent_id)
         self._housekeeping()
 
     def insert(self, node_data, parent_id="root"):
@@ -301,46 +585,169 @@ class Tree:
         assert parent_id in self.registry
         self.registry[node.id] = node
         node.parent = parent_id
+        node.level = self.registry[parent_id].level + 1
         self.registry[parent_id].data["children"].append(node.id)
+        self._invalidate(parent_id)
         self._housekeeping()
         return node
 
+    def update(self, node: Union[str, Node]):
+        """
+        Call after editing a node's data in place so that listeners see the
+        change. Content should be changed with `set_content` instead.
+        Inside a `batch`, listeners are notified when the batch ends.
+        """
+        self._invalidate(self._handle_type(node).id)
+        self._housekeeping()
+
+    def set_content(self, node: Union[str, Node], content: list):
+        """
+        Replaces the content of `node`, e.g.
+
+            tree.set_content(node, node.data["content"] + [item])
+
+        This is the only way content should change, since `subtree_text`
+        caches the text of every subtree until the tree is told about it.
+        """
+        node = self._handle_type(node)
+        node.data["content"] = list(content)
+        self.update(node)
+
     def remove(self, node: Union[str, Node], recursive: bool = True):
         node = self._handle_type(node)
+        self._invalidate(node.id)
         if recursive:  # remove children from registry
             for c in list(self.dfs(node.id)):
                 self.registry.pop(c.id)
-        else:  # move children up
-            for c in node.data["children"]:
+                self._text_cache.pop(c.id, None)
+            # remove from parent's children
+            self._disown(node)
+            self._housekeeping()
+            return
+
+        with self.batch():  # move children up
+            for c in list(node.data["children"]):
                 self.move(c, node.parent)
-
-        # remove from parent's children
-        self._disown(node)
-        self._housekeeping()
+            self._disown(node)
+            self.registry.pop(node.id)
 
     def remove_children(self, node: Union[str, Node]):
         node = self._handle_type(node)
-        for c in list(self.dfs(node.id))[1:]:
-            self.registry.pop(c.id)
-        node.data["children"] = []
-        self._housekeeping()
+        with self.batch():
+            self._invalidate(node.id)
+            for c in list(self.dfs(node.id))[1:]:
+                self.registry.pop(c.id)
+                self._text_cache.pop(c.id, None)
+            node.data["children"].clear()
+            self._touch(node.id)
 
-    def bfs(self, node_ids: Union[str, List[str]] = "root"):
+    @staticmethod
+    def _filter(types=None, page=None):
+        """
+        Predicate for the `types` and `page` arguments of the traversals
+        (None if every node is wanted)
+        """
+        if types is None and page is None:
+            return None
+        if isinstance(types, str):
+            types = {types}
+
+        def match(node):
+            if types is not None and node.data.get("type") not in types:
+                return False
+            if page is not None:
+                content = node.data.get("content") or []
+                return any(c.get("page") == page for c in content)
+            return True
+
+        return match
+
+    def dfs(
+        self,
+        node_id: str = "root",
+        types=None,
+        page: int = None,
+        expand=None,
+    ):
+        """
+        Yields the nodes beneath (and including) `node_id` in pre-order,
+        i.e. every node before its children.
+
+        The traversals (`dfs`, `postorder` and `bfs`) use an explicit stack
+        or queue, so deep trees don't hit the recursion limit. They share
+        these filters:
+
+        types <str or set[str]> (None): Only yield nodes of these types
+        page <int> (None): Only yield nodes with content on this page
+        expand <func> (None): Only visit the children of nodes for which
+            `expand(node)` is true. The filters above don't prune, i.e.
+            the children of a node are visited even if it is not yielded.
+
+        Nodes should not be added or removed while iterating.
+        """
+        registry = self.registry
+        match = self._filter(types, page)
+        stack = [node_id]
+        while stack:
+            node = registry[stack.pop()]
+            if match is None or match(node):
+                yield node
+            if expand is None or expand(node):
+                stack.extend(reversed(node.data["children"]))
+
+    def postorder(
+        self,
+        node_id: str = "root",
+        types=None,
+        page: int = None,
+        expand=None,
+    ):
+        """
+        Yields the nodes beneath (and including) `node_id` with every node
+        after its children. See `dfs` for the arguments.
+        """
+        registry = self.registry
+        match = self._filter(types, page)
+        node = registry[node_id]
+        path = [node]
+        children = [iter(node.data["children"])]
+        while path:
+            for c in children[-1]:
+                node = registry[c]
+                path.append(node)
+                if expand is None or expand(node):
+                    children.append(iter(node.data["children"]))
+                else:
+                    children.append(iter(()))
+                break
+            else:
+                children.pop()
+                node = path.pop()
+                if match is None or match(node):
+                    yield node
+
+    def bfs(
+        self,
+        node_ids: Union[str, List[str]] = "root",
+        types=None,
+        page: int = None,
+        expand=None,
+    ):
+        """
+        Yields the nodes beneath (and including) `node_ids` level by
+        level. See `dfs` for the arguments.
+        """
         if isinstance(node_ids, str):
             node_ids = [node_ids]
-        for c in node_ids:
-            yield self.registry[c]
-        next_ids = sum(
-            [self.registry[node_id].data["children"] for node_id in node_ids],
-            [],
-        )
-        if next_ids:
-            yield from self.bfs(next_ids)
-
-    def dfs(self, node_id: str = "root"):
-        yield self.registry[node_id]
-        for c in self.registry[node_id].data["children"]:
-            yield from self.dfs(c)
+        registry = self.registry
+        match = self._filter(types, page)
+        queue = deque(node_ids)
+        while queue:
+            node = registry[queue.popleft()]
+            if match is None or match(node):
+                yield node
+            if expand is None or expand(node):
+                queue.extend(node.data["children"])
 
     def to_list(self, node_id: str = "root"):
         result = []
@@ -358,6 +765,7 @@ class Tree:
         root = Path(root)
         skip = len(root.parts)
         self.registry = {"root": self.root}
+        self._text_cache = {}
         self.root.data["label"] = str(root)
         self.root.data["type"] = "folder"
 
@@ -385,10 +793,10 @@ class Tree:
         self.insert_nested_dicts(nodes["children"])
 
     def __repr__(self, node_id: str = "root", level=0):
-        collector = f"{' '*level}{self.registry[node_id]}\n"
-        for c in self.registry[node_id].data["children"]:
-            collector += self.__repr__(c, level + 1)
-        return collector
+        top = self.registry[node_id].level - level
+        return "".join(
+            f"{' ' * (node.level - top)}{node}\n" for node in self.dfs(node_id)
+        )
 
 
 class TreeWidget(ipyw.VBox):
@@ -461,16 +869,13 @@ class TreeWidget(ipyw.VBox):
             self.selected_node = self.tree.registry[self.selected_id]
 
     def _compute_visible(self, id="root"):
-        collector = []
-        node = self.tree.registry[id]
-        collector.append(node)
-        if node.opened:
-            for c in node.data["children"]:
-                collector += self._compute_visible(c)
-        return collector
+        return list(self.tree.dfs(id, expand=lambda node: node.opened))
 
     def compute_visible(self):
         self.viewable_nodes = self._compute_visible()
+        self.viewable_index = {
+            n.id: i for i, n in enumerate(self.viewable_nodes)
+        }
         if len(self.viewable_nodes) > 1:
             previous_max = self.slider.max
             previous_value = self.slider.value
@@ -526,10 +931,7 @@ class TreeWidget(ipyw.VBox):
         self.compute_visible()
         self.refresh()
 
-        for i, n in enumerate(self.viewable_nodes):
-            if n.id == node.id:
-                self.cursor = i
-                break
+        self.cursor = self.viewable_index.get(node.id, self.cursor)
         self.slider.value = len(self.viewable_nodes) - self.cursor
         self.refresh()
 
@@ -1,13 +1,14 @@
 import sys
-from collections import defaultdict
+import threading
+import time
+from functools import partial
 from pathlib import Path
 
-import deepdoctection as dd
 import pandas as pd
-import spacy
 from ipycytoscape import CytoscapeWidget
 from ipywidgets import (
     HTML,
+    BoundedIntText,
     Button,
     Checkbox,
     FloatSlider,
@@ -20,10 +21,27 @@ from ipywidgets import (
 )
 
 from ..utils.constants import NODE_COLORS
+from ..utils.edit_distance import best_matches
 from ..utils.image_utils import ImageContainer, rel_2_pil
-from ..utils.lp_util import parse_layout
-from ..utils.nlp import tfidf_similarity
-from ..utils.table_extraction import img_2_table
+from ..utils.lp_util import (
+    get_analyzer,
+    layout_to_nodes,
+    parse_layout,
+    parse_layout_fused,
+)
+from ..utils.lsh import MinHashLSH
+from ..utils.spacy_utils import (
+    DEFAULT_MODEL,
+    extract_entities,
+    load_pipeline,
+    token_rows,
+)
+from ..utils.table_extraction import (
+    img_2_table,
+    parse_tables,
+    ruled_img_2_table,
+)
+from ..utils.table_store import get_table, set_table
 from ..utils.tess_utils import get_text_blocks
 from ..utils.tree_utils import (
     file_path,
@@ -31,6 +49,7 @@ from ..utils.tree_utils import (
     natural_path,
     select,
     stringify,
+    tfidf_index,
 )
 from .dataframe_widget import DataFrame
 from .helper_widgets import SmallButton, Warnings
@@ -62,6 +81,12 @@ TESS_DESC = (
     + "on a much more diverse dataset."
 )
 
+TABLE_DESC = (
+    "Table Extraction parses every table beneath the selected node."
+    + " Each page is rendered once and the tables on it are parsed in"
+    + " parallel. Check `Ruled lines` for tables with a visible grid."
+)
+
 NAVIGATOR = None
 PYTHON = sys.executable
 PREFIX = Path(PYTHON).parent
@@ -199,14 +224,19 @@ class TextBlockTools(MyTab):
         """
         Updates the tab to show updated content. Lists out each of
         the elements in self.node.data["content"] as a block of text
-        to show the results of the OCR.
-        TODO: These boxes are editable, but there's no procedure for
-        propagating changes back to the node
+        to show the results of the OCR. Edits are written back to the node.
         """
-        self.children = [
-            VBox([Textarea(x["value"]) for x in self.node.data["content"]]),
-            self.delete_btn,
-        ]
+        boxes = []
+        for i, x in enumerate(self.node.data["content"]):
+            box = Textarea(x["value"] or "", continuous_update=False)
+            box.observe(partial(self.edit_content, i), "value")
+            boxes.append(box)
+        self.children = [VBox(boxes), self.delete_btn]
+
+    def edit_content(self, i, change):
+        content = list(self.node.data["content"])
+        content[i] = dict(content[i], value=change["new"])
+        self.node.controller.set_content(self.node, content)
 
     def set_node(self, node):
         self.node = node
@@ -220,36 +250,61 @@ class SpacyInsights(MyTab):
 
         self.info = Warnings()
         self.model_path = Text(
-            placeholder="path/to/pipeline  (en_core_web_sm)",
+            placeholder=f"path/to/pipeline  ({DEFAULT_MODEL})",
             continuous_update=False,
         )
         self.model_path.observe(self._load_custom_model, "value")
 
         self.refresh_btn = Button(
             description="Run Pipeline",
-            tooltip="Passes text within the current selection into the loaded nlp pipeline and displays the results in a table.",
+            tooltip="Passes text within the current selection into the loaded nlp pipeline and displays the named entities in a table.",
         )
         self.refresh_btn.on_click(self.refresh)
+        self.tokens_btn = Button(
+            description="Token Table",
+            tooltip="Also tags, lemmatizes and parses the text and shows the attributes of every token.",
+        )
+        self.tokens_btn.on_click(self.show_tokens)
+        self.batch_size = BoundedIntText(
+            64,
+            min=1,
+            max=10000,
+            description="Batch size",
+            tooltip="Number of text blocks passed to the pipeline at a time",
+        )
+        self.n_process = BoundedIntText(
+            1,
+            min=1,
+            max=64,
+            description="Processes",
+            tooltip="Number of processes running the pipeline",
+        )
 
-        self.utils = VBox([self.info, self.model_path, self.refresh_btn])
-        self.load_model()
+        self.utils = VBox(
+            [
+                self.info,
+                self.model_path,
+                HBox([self.batch_size, self.n_process]),
+                HBox([self.refresh_btn, self.tokens_btn]),
+            ]
+        )
+        self.model = DEFAULT_MODEL
 
     def _load_custom_model(self, _):
         self.load_model(self.model_path.value)
 
-    def load_model(self, path="en_core_web_sm"):
-
+    def load_model(self, path=DEFAULT_MODEL):
+        """
+        Selects the pipeline to use. It is only loaded when the pipeline is
+        first run.
+        """
         # Use the default if the text box is empty
-        path = path if path else "en_core_web_sm"
-
+        self.model = path if path else DEFAULT_MODEL
         self.info.clear()
-        try:
-            self.nlp = spacy.load(path)
-            self.info.add(f"Using `{path}`")
-            self.refresh_btn.disabled = False
-        except:
-            self.info.add(f"Failed to load `{path}`", 1)
-            self.refresh_btn.disabled = True
+
+    @property
+    def nlp(self):
+        return load_pipeline(self.model)
 
     def set_node(self, node):
         self.node = node
@@ -260,32 +315,55 @@ class SpacyInsights(MyTab):
         else:
             self.children = [self.utils]
 
-    def refresh(self, _=None):
-        doc = self.nlp(stringify(self.node))
-        ents = defaultdict(int)
-        for ent in doc.ents:
-            ents[(ent.text, ent.label_)] += 1
-        ent_rows = []
-        for k, v in ents.items():
-            ent_rows.append({"Entity": k[0], "Label": k[1], "Count": v})
-        ent_rows.sort(key=lambda x: x["Count"], reverse=True)
-        self.node.data["spacy-ents"] = ent_rows
-        ents = pd.DataFrame(ent_rows)
-        token_df = pd.DataFrame(
-            [
-                {
-                    "TEXT": token.text,
-                    "LEMMA": token.lemma_,
-                    "POS": token.pos_,
-                    "TAG": token.tag_,
-                    "DEP": token.dep_,
-                }
-                for token in doc
-            ]
+    def run(self, tokens=False):
+        """
+        Streams each text block beneath the node through the pipeline. The
+        entity counts are stored on every node of the subtree, so selecting
+        a child afterwards shows its share without running it again. Text
+        blocks which were parsed before by the same pipeline are skipped.
+
+        Returns the entity rows, or None if the pipeline failed to load.
+        """
+        self.info.clear()
+        try:
+            nlp = self.nlp
+        except Exception:
+            self.info.add(f"Failed to load `{self.model}`", 1)
+            return None
+
+        parsed = []
+        ent_rows = extract_entities(
+            nlp,
+            self.node,
+            batch_size=self.batch_size.value,
+            n_process=self.n_process.value,
+            tokens=tokens,
+            callback=lambda node, doc: parsed.append(node),
+        )
+        self.info.add(
+            f"Using `{self.model}`. Parsed {len(parsed)} text blocks."
+            + " Unchanged blocks were read from the cache."
         )
+        return ent_rows
+
+    def refresh(self, _=None):
+        ent_rows = self.run()
+        if ent_rows is None:
+            return
+        self.children = [VBox([self.utils, DataFrame(pd.DataFrame(ent_rows))])]
 
+    def show_tokens(self, _=None):
+        ent_rows = self.run(tokens=True)
+        if ent_rows is None:
+            return
         self.children = [
-            VBox([self.utils, DataFrame(ents), DataFrame(token_df)])
+            VBox(
+                [
+                    self.utils,
+                    DataFrame(pd.DataFrame(ent_rows)),
+                    DataFrame(pd.DataFrame(token_rows(self.node))),
+                ]
+            )
         ]
 
 
@@ -293,25 +371,49 @@ class Cytoscape(MyTab):
     def __init__(self, node):
         super().__init__()
         self.node = node
+        self.keys = []  # document node of each row of self.sim
+        self.sim = None  # sparse similarity graph
+        self.edges = []
         self.refresh_btn = SmallButton(
             "refresh", "Recompute network", self.refresh
         )
         self.slider = FloatSlider(0.4, min=0, max=1)
+        self.slider.observe(self.draw, "value")
+        self.top_k = BoundedIntText(
+            10,
+            min=1,
+            max=1000,
+            description="Neighbors",
+            tooltip="Maximum number of links computed for each section",
+        )
         self.config_btn_recursive = Checkbox(True, description="Recursive")
         self.config_btn_intradoc = Checkbox(
             True, description="Intra-document connections"
         )
+        self.config_btn_intradoc.observe(self.draw, "value")
+        self.config_btn_minhash = Checkbox(
+            False,
+            description="Near duplicates (MinHash)",
+            tooltip="Link sections by the overlap of their word shingles"
+            + " instead of tf-idf similarity",
+        )
         self.export_btn = SmallButton(
             "download", "Save edgelist", self.export_edge_list
         )
+        self.show(HTML("Hit refresh to generate cytoscape"))
+
+    def show(self, widget, export=False):
+        buttons = [self.export_btn, self.refresh_btn] if export else []
         self.children = [
             VBox(
                 [
-                    self.refresh_btn,
+                    HBox(buttons) if export else self.refresh_btn,
                     self.slider,
+                    self.top_k,
                     self.config_btn_recursive,
                     self.config_btn_intradoc,
-                    HTML("Hit refresh to generate cytoscape"),
+                    self.config_btn_minhash,
+                    widget,
                 ]
             )
         ]
@@ -323,25 +425,22 @@ class Cytoscape(MyTab):
         # NODE_REGISTER[event["data"]["id"]].selected = True  # TODO: fix this
 
     def refresh(self, _=None):
+        """
+        Computes the similarity graph of the sections beneath the selected
+        node. Only the `top_k` strongest links of each section are kept, so
+        moving the slider re-filters this result instead of recomputing it.
+        The tree's tf-idf index only re-tokenises sections whose text has
+        changed since the last refresh.
+        With MinHash, only pairs which share an LSH bucket are linked.
+        """
         self.computed_file_path = file_path(self.node)
-        self.children = [
-            VBox(
-                [
-                    self.refresh_btn,
-                    self.slider,
-                    self.config_btn_recursive,
-                    self.config_btn_intradoc,
-                    HTML("loading..."),
-                ]
-            )
-        ]
+        self.show(HTML("loading..."))
         if self.config_btn_recursive.value:
-            gen = self.node.controller.dfs(self.node.id)
-            next(gen)  # skip first
+            tree = self.node.controller
             docs = {
                 node: stringify(node)
-                for node in gen
-                if node.data["type"] == "section"
+                for node in tree.dfs(self.node.id, types="section")
+                if node is not self.node
             }
         else:
             docs = {
@@ -354,46 +453,56 @@ class Cytoscape(MyTab):
             if v == "":
                 docs.pop(doc)
 
-        sim = tfidf_similarity(docs)
-        if len(sim) == 0:
-            self.children = [
-                VBox(
-                    [
-                        self.refresh_btn,
-                        self.slider,
-                        self.config_btn_recursive,
-                        self.config_btn_intradoc,
-                        HTML("Not enough nodes"),
-                    ]
-                )
-            ]
-            return
+        if self.config_btn_minhash.value:
+            index = MinHashLSH()
+            for node, text in docs.items():
+                index.add(node, text)
+            self.keys, self.sim = index.graph()
+        else:
+            tree = self.node.controller
+            keys, self.sim = tfidf_index(tree).similarity_graph(
+                {node.id: text for node, text in docs.items()},
+                top_k=self.top_k.value,
+            )
+            self.keys = [tree.registry[k] for k in keys]
+        sim = self.sim.tocoo()
+        self.edges = [
+            [self.keys[i].id, self.keys[j].id, w]
+            for i, j, w in zip(sim.row, sim.col, sim.data)
+        ]
+        self.draw()
 
-        files = set(
-            [file_path(x[0]) for x in sim] + [file_path(x[1]) for x in sim]
-        )
-        cmap = {k: NODE_COLORS[i] for i, k in enumerate(files)}
+    def draw(self, _=None):
+        """Draws the links of the cached graph which exceed the slider"""
+        if self.sim is None:
+            return
+        if self.sim.nnz == 0:
+            self.show(HTML("Not enough nodes"))
+            return
 
+        sim = self.sim.tocoo()
+        keep = sim.data > self.slider.value
         g_edges = []
-        self.edges = []
         nodes_with_edges = set()
-        for source, target, weight in sim:
-            self.edges.append([source.id, target.id, weight])
-            if weight > self.slider.value and source.id != target.id:
-
-                if self.config_btn_intradoc.value or file_path(
-                    source
-                ) != file_path(target):
-                    nodes_with_edges.add(source)
-                    nodes_with_edges.add(target)
-                    g_edges.append(
-                        {
-                            "data": {
-                                "source": source.id,
-                                "target": target.id,
-                            }
+        for i, j in zip(sim.row[keep], sim.col[keep]):
+            source = self.keys[i]
+            target = self.keys[j]
+            if self.config_btn_intradoc.value or file_path(
+                source
+            ) != file_path(target):
+                nodes_with_edges.add(source)
+                nodes_with_edges.add(target)
+                g_edges.append(
+                    {
+                        "data": {
+                            "source": source.id,
+                            "target": target.id,
                         }
-                    )
+                    }
+                )
+
+        files = set(file_path(x) for x in nodes_with_edges)
+        cmap = {k: NODE_COLORS[i] for i, k in enumerate(files)}
 
         graph_dict = {
             "nodes": [
@@ -413,22 +522,7 @@ class Cytoscape(MyTab):
         cyto.graph.add_graph_from_json(graph_dict)
         cyto.on("node", "click", self.on_node_click)
 
-        self.children = [
-            VBox(
-                [
-                    HBox(
-                        [
-                            self.export_btn,
-                            self.refresh_btn,
-                        ]
-                    ),
-                    self.slider,
-                    self.config_btn_recursive,
-                    self.config_btn_intradoc,
-                    cyto,
-                ]
-            )
-        ]
+        self.show(cyto, export=True)
 
         cyto.set_style(
             [
@@ -477,10 +571,37 @@ class AutoTools(MyTab):
 
         # ---------------------- Settings ----------------------
 
+        self.render_once = Checkbox(
+            False,
+            description="Render pages once",
+            tooltip=(
+                "Keep the rendered pages of the selected pdf in memory "
+                + "(about 11 MB per page) and share them between layout "
+                + "detection, text extraction and table parsing"
+            ),
+        )
+        self.render_once.observe(self.release_images, "value")
+        self.fuse_ocr = Checkbox(
+            False,
+            description="Tesseract text for layout",
+            tooltip=(
+                "Skip deepdoctection's OCR and fill each layout block "
+                + "with words from a single Tesseract pass"
+            ),
+        )
+        self.cpu_backend = Checkbox(
+            False,
+            description="Quantized CPU model",
+            tooltip=(
+                "Run layout detection with int8 weights. Faster on CPU "
+                + "at a small cost in accuracy"
+            ),
+        )
+        self._imgs = None
+        self._job_lock = threading.Lock()  # see `in_background`
+        self.job = None
         self.settings = VBox(
-            [
-                # No Settings Yet
-            ]
+            [self.render_once, self.fuse_ocr, self.cpu_backend]
         )
 
         # --------------------- Tesseract ---------------------
@@ -497,7 +618,7 @@ class AutoTools(MyTab):
         self.text_extraction.children = [self.te_desc, self.tesseract_btn]
 
         # --------------------- LayoutParser ---------------------
-        self.lp_model = None
+        self.lp_models = {}  # keyed by (ocr, backend)
         self.layout_extraction = VBox()
         self.layoutparser_btn = Button(
             description="Parse Layout",
@@ -514,144 +635,246 @@ class AutoTools(MyTab):
             self.layoutparser_btn,
         ]
 
+        # ----------------------- Tables -----------------------
+        self.table_report = {}
+        self.ruled_tables = Checkbox(False, description="Ruled lines")
+        self.tables_btn = Button(
+            description="Parse Tables",
+            tooltip="Parse every table node beneath the selected node",
+        )
+        self.tables_btn.on_click(self.parse_tables)
+        self.table_extraction = VBox(
+            [
+                HTML(
+                    value=TABLE_DESC,
+                    layout={"width": "400px"},
+                ),
+                self.ruled_tables,
+                self.tables_btn,
+            ]
+        )
+
         self.options = VBox(
             children=[
                 self.settings,
                 self.info,
                 self.text_extraction,
                 self.layout_extraction,
+                self.table_extraction,
             ]
         )
 
         self.children = [self.options]
 
+    def set_node(self, node):
+        super().set_node(node)
+        if self._imgs is not None and self._imgs.fname != str(file_path(node)):
+            self.release_images()
+
+    def page_images(self, path):
+        """
+        Returns the shared page images for `path` when "Render pages once"
+        is checked, otherwise None (each step renders the pdf itself).
+        Every rendered page is kept, so that e.g. "Text Only" after
+        "Parse Layout" reuses the pages. They are dropped when another pdf
+        is selected or the setting is unchecked (see `release_images`).
+        """
+        if not self.render_once.value:
+            return None
+        if self._imgs is None or self._imgs.fname != str(path):
+            self._imgs = ImageContainer(path, bulk_render=False, cache=-1)
+        return self._imgs
+
+    def release_images(self, _=None):
+        self._imgs = None
+
+    def get_model(self):
+        """Loads (once) the layout model matching the current settings"""
+        key = (
+            not self.fuse_ocr.value,
+            "cpu" if self.cpu_backend.value else "default",
+        )
+        if key not in self.lp_models:
+            model = get_analyzer(ocr=key[0], backend=key[1])
+            self.lp_models[key] = model
+            report = getattr(model, "cpu_optimization", None)
+            if report is not None:
+                if report["linear"] or report["conv"]:
+                    self.info.add(
+                        f"CPU model: {report['linear']} linear layers"
+                        + f" quantized, {report['conv']} conv layers"
+                        + " converted to channels-last"
+                    )
+                else:
+                    self.info.add("CPU model: nothing to optimize", 1)
+        return self.lp_models[key]
+
+    def iter_text_content(self, path):
+        """
+        Runs each page through Tesseract and yields the list of non-empty
+        text blocks (as node content) found on it, one page at a time.
+        """
+        for page in get_text_blocks(path, self.page_images(path)):
+            content = []
+            for tb in page:
+                tb["value"] = tb["value"].strip()
+                tb["coords"] = tb.pop("rel_coords")
+                tb.pop("pil_coords")
+                if tb["value"]:
+                    content.append(tb)
+            yield content
+
+    def in_background(self, btn, work):
+        """
+        Runs `work` in a background thread when it was started from `btn`,
+        so that the kernel keeps handling events (e.g. browsing the pages
+        which are already in the tree) while it runs. The button is
+        disabled until it finishes and errors are reported in `self.info`.
+        Called without a button (e.g. from a script), `work` runs in the
+        calling thread. Jobs of the same tab run one at a time.
+        """
+        if not isinstance(btn, Button):
+            with self._job_lock:
+                return work()
+
+        def run():
+            try:
+                with self._job_lock:
+                    work()
+            except Exception as e:
+                self.info.add(f"{type(e).__name__}: {e}", 1)
+            finally:
+                btn.disabled = False
+
+        btn.disabled = True
+        self.job = threading.Thread(target=run, daemon=True)
+        self.job.start()
+        return self.job
+
     def extract_text(self, btn=None, page_idxs=None):
         """
         Runs each page through Tesseract to get plain text.
         A new monolithic text node is added as a child to the selected node.
-        The text can be accessed from the new node's data attribute.
+        The text can be accessed from the new node's data attribute. Content
+        is appended to the node as each page finishes (see `in_background`).
 
         page_idxs: list of integers
         """
-        if isinstance(btn, Button):
-            btn.disabled = True
+        node = self.node
+        return self.in_background(
+            btn, lambda: self._extract_text(node, page_idxs)
+        )
+
+    def _extract_text(self, node, page_idxs=None):
+        tree = node.controller
         text_node = {
             "type": "text",
-            "parent": self.node.id,
+            "parent": node.id,
             "children": [],
             "content": [],
         }
-        path = file_path(self.node)
+        path = file_path(node)
         pages = ImageContainer(path, bulk_render=False).info["Pages"]
         if page_idxs is not None:
             pages = [pages[i] for i in page_idxs]
         i = 0
         m = f""
         self.info.add(m)
-        for page in get_text_blocks(path):
+        text_node = tree.insert(text_node, node.id)
+        for content in self.iter_text_content(path):
             i += 1
             self.info.remove(m)
             m = f"Extracting Text: Page {i}/{pages}"
             self.info.add(m)
 
-            for tb in page:
-                tb["value"] = tb["value"].strip()
-                tb["coords"] = tb.pop("rel_coords")
-                tb.pop("pil_coords")
-                if tb["value"]:
-                    text_node["content"].append(tb)
+            tree.set_content(text_node, text_node.data["content"] + content)
         self.info.remove(m)
-        self.node.controller.insert(text_node, self.node.id)
 
-        if isinstance(btn, Button):
-            btn.disabled = False
+    def iter_layout_nodes(self, path):
+        """
+        Runs each page through the layout model and yields the list of
+        nodes (see `layout_to_nodes`) found on it, one page at a time.
+        """
+        imgs = self.page_images(path)
+        model = self.get_model()
+        if self.fuse_ocr.value:
+            layouts = parse_layout_fused(path, model, imgs)
+        else:
+            layouts = parse_layout(path, model, images=imgs)
+        for i, layout in enumerate(layouts):
+            yield layout_to_nodes(layout, i)
 
     def extract_layout(self, btn=None):
-        if isinstance(btn, Button):
-            btn.disabled = True
-        self.layoutparser_btn.disabled = True
-        path = file_path(self.node)
-
-        nodes = []
+        """
+        Adds the nodes of each page to the tree as soon as the page has been
+        parsed, so earlier pages can be browsed while the rest are processed
+        (see `in_background`).
+        """
+        node = self.node
+        return self.in_background(btn, lambda: self._extract_layout(node))
 
+    def _extract_layout(self, node):
+        tree = node.controller
+        path = file_path(node)
         i = 0
         total = ImageContainer(path, bulk_render=False).info["Pages"]
         m = f"Parsing Layout: {i+1}/{total}"
         self.info.add(m)
-        if self.lp_model is None:
-            self.lp_model = dd.get_dd_analyzer()
-        for layout in parse_layout(path, self.lp_model):
-            for block in layout:
-
-                if block.type == "Title":
-                    nodes.append(
-                        {
-                            "id": block.annotation_id,
-                            "type": "section",
-                            "content": [
-                                {
-                                    "value": block.text,
-                                    "page": i,
-                                    "coords": block.relative_coordinates,
-                                }
-                            ],
-                            "label": block.text,
-                            "children": block.children,
-                        },
-                    )
-                elif block.type in ["List", "Text"]:
-                    nodes.append(
-                        {
-                            "id": block.annotation_id,
-                            "type": "text",
-                            "content": [
-                                {
-                                    "value": block.text,
-                                    "page": i,
-                                    "coords": block.relative_coordinates,
-                                }
-                            ],
-                            "children": block.children,
-                        },
-                    )
-                elif block.type == "Figure":
-                    nodes.append(
-                        {
-                            "id": block.annotation_id,
-                            "type": "image",
-                            "content": [
-                                {
-                                    "value": None,
-                                    "page": i,
-                                    "coords": block.relative_coordinates,
-                                }
-                            ],
-                            "children": block.children,
-                        }
-                    )
-                elif block.type == "Table":
-                    nodes.append(
-                        {
-                            "id": block.annotation_id,
-                            "type": "table",
-                            "content": [
-                                {
-                                    "value": None,
-                                    "page": i,
-                                    "coords": block.relative_coordinates,
-                                }
-                            ],
-                            "table": block.csv,
-                            "children": block.children,
-                        }
-                    )
+        for nodes in self.iter_layout_nodes(path):
+            tree.add_multiple(nodes, parent=str(path))
 
             i += 1
             self.info.remove(m)
             m = f"Parsing Layout: {i+1}/{total}"
             self.info.add(m)
         self.info.remove(m)
-        self.node.controller.add_multiple(nodes, parent=str(path))
+
+    def parse_tables(self, btn=None):
+        """
+        Parses every table node beneath the selected node and stores each
+        one with `set_table`. Per-table timings and errors are kept
+        in `self.table_report`.
+        """
+        if isinstance(btn, Button):
+            btn.disabled = True
+        tree = self.node.controller
+        path = file_path(self.node)
+        jobs = [
+            (
+                n.id,
+                n.data["content"][0]["page"],
+                n.data["content"][0]["coords"],
+            )
+            for n in tree.dfs(self.node.id, types="table")
+            if n.data.get("content")
+        ]
+        m = f"Parsing {len(jobs)} tables"
+        self.info.add(m)
+
+        imgs = self.page_images(path)
+        if imgs is None:
+            imgs = ImageContainer(path, bulk_render=False)
+        engine = ruled_img_2_table if self.ruled_tables.value else img_2_table
+        start = time.perf_counter()
+        self.table_report = parse_tables(imgs, jobs, engine)
+        seconds = time.perf_counter() - start
+
+        self.info.remove(m)
+        failed = []
+        for node_id, result in self.table_report.items():
+            if result["error"] is None:
+                set_table(tree.registry[node_id], result["rows"])
+            else:
+                failed.append(
+                    tree.registry[node_id].data.get("label", node_id)
+                )
+        self.info.add(
+            f"Parsed {len(jobs) - len(failed)}/{len(jobs)} tables"
+            + f" in {seconds:.1f}s"
+        )
+        if failed:
+            self.info.add(f"Failed: {', '.join(failed)}", 1)
+        tree.update(self.node)
 
         if isinstance(btn, Button):
             btn.disabled = False
@@ -670,37 +893,50 @@ class TableTools(MyTab):
             ),
         )
         self.parse_table_btn.on_click(self.parse_table)
-        self.children = [self.parse_table_btn, self.delete_btn]
+        self.parse_ruled_btn = Button(
+            description="Parse Table (Ruled Lines)",
+            tooltip=(
+                "Construct a dataframe from the lines drawn between cells, "
+                + "then read each cell. Faster and more accurate on tables "
+                + "with a visible grid"
+            ),
+        )
+        self.parse_ruled_btn.on_click(self.parse_ruled_table)
+        self.buttons = HBox(
+            [self.parse_table_btn, self.parse_ruled_btn, self.delete_btn]
+        )
+        self.children = [self.buttons]
 
     def set_node(self, node):
         super().set_node(node)
-        if "table" in self.node.data:
-            rows = self.node.data["table"]
-            if rows:
-                df = pd.DataFrame(rows[1:])
-                df.columns = rows[0]
-            else:
-                df = pd.DataFrame(rows)
+        df = get_table(self.node)
+        if df is not None:
             self.children = [
                 VBox(
                     children=[
-                        HBox(children=[self.parse_table_btn, self.delete_btn]),
-                        DataFrame(df, max_char=20),
+                        self.buttons,
+                        DataFrame(df.fillna(""), max_char=20),
                     ]
                 )
             ]
         else:
-            self.children = [self.parse_table_btn, self.delete_btn]
+            self.children = [self.buttons]
+
+    def parse_ruled_table(self, _=None):
+        self.parse_table(engine=ruled_img_2_table)
 
-    def parse_table(self, _=None):
+    def parse_table(self, _=None, engine=img_2_table):
+        """
+        engine <func> (img_2_table): Converts the cropped image of the table
+            into a list of rows
+        """
         path = file_path(self.node)
         imgs = ImageContainer(path, bulk_render=False)
         img = imgs[self.node.data["content"][0]["page"]]
         coords = self.node.data["content"][0]["coords"]
 
         cropped_img = img.crop(rel_2_pil(coords, img.width, img.height))
-        rows = img_2_table(cropped_img)
-        self.node.data["table"] = rows
+        set_table(self.node, engine(cropped_img))
 
         # Refresh the tab to show the table
         self.set_node(self.node)
@@ -733,11 +969,17 @@ class Search(MyTab):
             layout={"width": "40px"},
             tooltip="Regular Expression (certain patterns require case-sensitivity to function properly)",
         )
+        self.fuzzy = ToggleButton(
+            description="~",
+            layout={"width": "40px"},
+            tooltip="Match section headings allowing for a few typos (e.g. OCR errors)",
+        )
         self.result_window = VBox()
         search_options = HBox(
             [
                 self.case_match,
                 self.regex,
+                self.fuzzy,
                 self.partial_search,
             ]
         )
@@ -750,6 +992,7 @@ class Search(MyTab):
         kwargs:
             case_sensitive <bool>
             regex <bool>
+            fuzzy <bool>
             query <str>
         """
         # Handle kwargs
@@ -757,12 +1000,17 @@ class Search(MyTab):
             self.case_match.value = kwargs.pop("case_sensitive")
         if kwargs.get("regex"):
             self.regex.value = kwargs.pop("regex")
+        if kwargs.get("fuzzy"):
+            self.fuzzy.value = kwargs.pop("fuzzy")
         if kwargs.get("query"):
             q = kwargs.pop("query")
         else:
             q = self.input.value
         if not q:
             return
+        if self.fuzzy.value:
+            self.show_results(*self.fuzzy_search(q))
+            return
         # Format Query based on kwargs
         if not self.case_match.value:
             q = q.lower()
@@ -807,9 +1055,38 @@ class Search(MyTab):
                 counts.append(count)
                 exerpts.append("<br>".join(exerpt))
 
+        self.show_results(results, exerpts, counts)
+
+    def fuzzy_search(self, q):
+        """
+        Section headings within `len(q) // 4` edits (at least 1) of `q`,
+        closest first. Returns the same (results, exerpts, scores) as the
+        regular search, where the score is the negative edit distance.
+        """
+        tree = self.node.controller
+        node_id = self.node.id if self.partial_search.value else tree.root.id
+        fold = (lambda x: x) if self.case_match.value else str.lower
+        headings = {
+            n: fold(" ".join(n.data.get("label", "").split()))
+            for n in tree.dfs(node_id, types="section")
+        }
+        matches = best_matches(
+            fold(q.strip()),
+            headings,
+            limit=50,
+            max_distance=max(1, len(q.strip()) // 4),
+        )
+        results = [n for n, _ in matches]
+        exerpts = [
+            f"<mark>{n.data.get('label', '')}</mark> ({d} edits)"
+            for n, d in matches
+        ]
+        return results, exerpts, [-d for _, d in matches]
+
+    def show_results(self, results, exerpts, scores):
         widgets = []
         for n, t, c in sorted(
-            zip(results, exerpts, counts), key=lambda x: x[-1], reverse=True
+            zip(results, exerpts, scores), key=lambda x: x[-1], reverse=True
         ):
             p = natural_path(n)
             btn = Button(description=p, layout={"width": "300px"})
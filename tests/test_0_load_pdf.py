@@ -5,3 +5,27 @@ def test_pdfs_detected(app):
     """
     pdfs = [x.data["label"] for x in app.tree.dfs() if x.data["type"] == "pdf"]
     assert "doc.pdf" in pdfs
+
+
+def test_page_cache_is_bounded():
+    """
+    A caching container should only keep the most recently used pages
+    """
+    from ipypdf.utils.image_utils import ImageContainer
+
+    from .conftest import DOC_DIR
+
+    imgs = ImageContainer(
+        DOC_DIR / "sample_pdfs" / "doc.pdf", bulk_render=False, cache=1
+    )
+    first = imgs[0]
+    assert imgs[0] is first  # not rendered again
+    for _ in imgs:
+        pass
+    assert list(imgs.cache) == [len(imgs) - 1]
+    imgs.clear()
+    assert len(imgs.cache) == 0
+    imgs.cache_size = -1  # keep every page
+    for _ in imgs:
+        pass
+    assert list(imgs.cache) == list(range(len(imgs)))
@@ -0,0 +1,99 @@
+import json
+
+import spacy
+
+from ipypdf.utils.spacy_utils import (
+    entity_pipes,
+    extract_entities,
+    load_pipeline,
+    prewarm,
+    token_rows,
+)
+from ipypdf.widgets.better_tree import Tree
+
+
+def entity_pipeline():
+    nlp = spacy.blank("en")
+    ruler = nlp.add_pipe("entity_ruler")
+    ruler.add_patterns(
+        [
+            {"label": "ORG", "pattern": "Acme"},
+            {"label": "GPE", "pattern": "Ohio"},
+        ]
+    )
+    return nlp
+
+
+def text(value):
+    return {"type": "text", "children": [], "content": [{"value": value}]}
+
+
+def sample_tree():
+    tree = Tree()
+    doc = tree.insert({"type": "pdf", "label": "doc.pdf", "children": []})
+    s1 = tree.insert({"type": "section", "children": []}, doc.id)
+    s2 = tree.insert({"type": "section", "children": []}, doc.id)
+    tree.insert(text("Acme opened a plant in Ohio."), s1.id)
+    tree.insert(text("Acme again."), s1.id)
+    tree.insert(text("Nothing here."), s2.id)
+    tree.insert(text(""), s2.id)
+    return tree, doc, s1, s2
+
+
+def test_entities_per_section_and_document():
+    tree, doc, s1, s2 = sample_tree()
+    rows = extract_entities(entity_pipeline(), doc, batch_size=2)
+    assert rows == [
+        {"Entity": "Acme", "Label": "ORG", "Count": 2},
+        {"Entity": "Ohio", "Label": "GPE", "Count": 1},
+    ]
+    assert s1.data["spacy-ents"] == rows
+    assert s2.data["spacy-ents"] == []
+
+
+def test_unchanged_text_is_not_parsed_again():
+    tree, doc, s1, s2 = sample_tree()
+    nlp = entity_pipeline()
+    parsed = []
+
+    def callback(node, _):
+        parsed.append(node)
+
+    extract_entities(nlp, s1, callback=callback)
+    assert len(parsed) == 2
+    extract_entities(nlp, doc, tokens=True, callback=callback)
+    assert len(parsed) == 2 + 3  # tokens were not cached for s1 yet
+    assert token_rows(s2)[0] == {
+        "TEXT": "Nothing",
+        "LEMMA": "",
+        "POS": "",
+        "TAG": "",
+        "DEP": "",
+    }
+
+    parsed.clear()
+    edited = tree.registry[s1.data["children"][1]]
+    edited.data["content"][0]["value"] = "Ohio again."
+    rows = extract_entities(nlp, doc, tokens=True, callback=callback)
+    assert parsed == [edited]
+    assert rows[0] == {"Entity": "Ohio", "Label": "GPE", "Count": 2}
+
+    # the cache is saved with the document
+    json.dumps(tree.to_list())
+
+
+def test_token_components_are_skipped_for_entities():
+    nlp = entity_pipeline()
+    nlp.add_pipe("tagger")  # untrained, so it would fail if it ran
+    assert entity_pipes(nlp) == ["entity_ruler"]
+    tree, doc, s1, s2 = sample_tree()
+    assert extract_entities(nlp, doc)[0]["Entity"] == "Acme"
+
+
+def test_lazy_loading(tmp_path):
+    entity_pipeline().to_disk(tmp_path / "pipeline")
+    path = str(tmp_path / "pipeline")
+    prewarm(path).join()
+    nlp = load_pipeline(path)
+    assert nlp is load_pipeline(path)
+    assert nlp.pipe_names == ["entity_ruler"]
@@ -0,0 +1,196 @@
+import json
+import weakref
+
+import pytest
+
+from ipypdf.widgets.better_tree import ChildList, Tree
+
+
+def text(value):
+    return {"type": "text", "children": [], "content": [{"value": value}]}
+
+
+def ids(nodes):
+    return [n.id for n in nodes]
+
+
+def sample_tree():
+    tree = Tree()
+    a = tree.insert({"type": "section", "label": "a", "children": []})
+    b = tree.insert({"type": "section", "label": "b", "children": []}, a.id)
+    t1 = tree.insert(text("one two"), a.id)
+    t2 = tree.insert(text("three"), b.id)
+    return tree, a, b, t1, t2
+
+
+def test_subtree_text_follows_mutations():
+    tree, a, b, t1, t2 = sample_tree()
+    assert tree.subtree_text(a) == "three one two"  # depth first
+    assert tree.subtree_token_count("root") == 3
+    assert b.id in tree._text_cache
+
+    t2.data["content"].append({"value": "four"})
+    tree.update(t2)
+    assert tree.subtree_text("root") == "three four one two"
+
+    tree.move(t1, b, 0)
+    assert tree.subtree_text(b) == "one two three four"
+    tree.remove(b)
+    assert tree.subtree_text("root") == ""
+    assert tree.subtree_token_count(a) == 0
+
+
+def test_set_content():
+    tree, a, b, t1, t2 = sample_tree()
+    assert tree.subtree_text(a) == "three one two"
+    calls = []
+    tree.onchange(lambda: calls.append(1))
+    tree.set_content(t2, [{"value": "four"}, {"value": "five"}])
+    assert tree.subtree_text(a) == "four five one two"
+    assert tree.subtree_token_count(b) == 2
+    assert calls == [1]
+
+    with tree.batch():
+        tree.set_content(t1, [{"value": "six"}])
+        tree.update(t2)
+        assert calls == [1]
+        assert tree.subtree_text(a) == "four five six"
+    assert calls == [1, 1]
+
+
+def test_add_multiple_moves_existing_nodes():
+    """Existing nodes listed in add_multiple leave their old parent"""
+    tree, a, b, t1, t2 = sample_tree()
+    assert tree.subtree_text(b) == "three"
+    tree.add_multiple(
+        [{"id": "n", "type": "section", "children": [t2.id]}, t1]
+    )
+    assert b.data["children"] == []
+    assert a.data["children"] == [b.id]
+    assert tree.root.data["children"] == [a.id, "n", t1.id]
+    assert [t1.level, t2.level] == [1, 2]
+    assert tree.subtree_text(b) == ""
+    tree._validate()
+
+
+def test_depth_is_updated_for_moved_subtree():
+    tree, a, b, t1, t2 = sample_tree()
+    assert [a.level, b.level, t2.level] == [1, 2, 3]
+    tree.move(b, "root")
+    assert [b.level, t2.level] == [1, 2]
+    tree.add_multiple(
+        [
+            {"id": "s", "type": "section", "children": ["t"]},
+            {"id": "t", "type": "text", "children": [], "content": []},
+        ],
+        t2.id,
+    )
+    assert tree.registry["t"].level == 4
+    levels = {i: n.level for i, n in tree.registry.items()}
+    tree._compute_depth()
+    assert levels == {i: n.level for i, n in tree.registry.items()}
+
+
+def test_batch_notifies_once():
+    tree, a, b, t1, t2 = sample_tree()
+    calls = []
+    tree.onchange(lambda: calls.append(1))
+    with tree.batch():
+        tree.move(t1, "root")
+        tree.move(t2, "root")
+        with tree.batch():
+            tree.move(b, "root")
+        assert calls == []
+    assert calls == [1]
+    assert a.data["children"] == []
+    assert tree.root.data["children"] == [a.id, t1.id, t2.id, b.id]
+
+
+def test_remove_keeps_every_child():
+    tree, a, b, t1, t2 = sample_tree()
+    tree.remove(a, recursive=False)
+    assert a.id not in tree.registry
+    assert tree.root.data["children"] == [b.id, t1.id]
+    assert [b.level, t1.level, t2.level] == [1, 1, 2]
+    tree._validate()
+
+
+def test_batch_validates_touched_nodes():
+    tree, a, b, t1, t2 = sample_tree()
+    with pytest.raises(AssertionError):
+        with tree.batch():
+            tree.move(t1, b)
+            t1.parent = a.id  # broken link
+
+
+def test_batch_keeps_original_exception():
+    """A failing body is not masked by the validation of the batch"""
+    tree, a, b, t1, t2 = sample_tree()
+    calls = []
+    tree.onchange(lambda: calls.append(1))
+    with pytest.raises(KeyError):
+        with tree.batch():
+            tree.move(t1, b)
+            t1.parent = a.id  # broken link
+            tree.move("missing", b)
+    assert calls == [1]
+    assert tree._batch_depth == 0
+
+
+def test_child_list_positions():
+    children = ChildList(["a", "b", "c", "d"])
+    children.remove("b")
+    children.insert(0, "e")
+    assert children == ["e", "a", "c", "d"]
+    assert [children.index(x) for x in children] == [0, 1, 2, 3]
+    assert "b" not in children and "c" in children
+    with pytest.raises(ValueError):
+        children.index("b")
+
+    tree, a, b, t1, t2 = sample_tree()
+    tree.move(t1, a, 0)
+    assert a.data["children"].index(b.id) == 1
+    assert json.loads(json.dumps(tree.to_list())) == tree.to_list()
+
+
+def test_traversal_orders_and_filters():
+    tree, a, b, t1, t2 = sample_tree()
+    t1.data["content"] = [{"value": "one two", "page": 1}]
+    assert ids(tree.dfs()) == ["root", a.id, b.id, t2.id, t1.id]
+    assert ids(tree.postorder()) == [t2.id, b.id, t1.id, a.id, "root"]
+    assert ids(tree.bfs()) == ["root", a.id, b.id, t1.id, t2.id]
+    assert ids(tree.dfs(types="text")) == [t2.id, t1.id]
+    assert ids(tree.bfs(types={"text", "section"}, page=1)) == [t1.id]
+    assert ids(tree.dfs(expand=lambda n: n.id != b.id)) == [
+        "root",
+        a.id,
+        b.id,
+        t1.id,
+    ]
+
+
+def test_deep_tree_does_not_recurse():
+    depth = 5000
+    tree = Tree(
+        [
+            {"id": str(i), "type": "section", "children": [str(i + 1)]}
+            for i in range(depth)
+        ]
+        + [dict(text("leaf"), id=str(depth))]
+    )
+    assert len(list(tree.dfs())) == depth + 2
+    assert next(tree.postorder()).id == str(depth)
+    assert tree.subtree_text("root") == "leaf"
+    assert repr(tree).endswith(" " * (depth + 1) + "Node(5000)\n")
+
+
+def test_nodes_are_compact():
+    tree, a, b, t1, t2 = sample_tree()
+    data = {"id": "x", "type": "".join(["te", "xt"]), "children": []}
+    tree.add_multiple([dict(data)], a.id)
+    x = tree.registry["x"]
+    assert not hasattr(x, "__dict__")
+    assert x.data["type"] is t1.data["type"]
+    assert x.data["id"] is x.id is a.data["children"][-1]
+    assert x.to_dict() == dict(data, children=[])
+    assert weakref.ref(x)() is x
@@ -1,3 +1,6 @@
+import pandas as pd
+
+from ipypdf.utils.tess_utils import words_in_boxes
 from ipypdf.widgets.node_tools import AutoTools
 
 
@@ -15,3 +18,62 @@ def test_parse_text(app, pdf_nodes):
 
     # Cleanup
     app.tree.remove_children(doc_node)
+
+
+def test_extract_text_in_background(app, pdf_nodes):
+    """
+    Started from its button the job runs in a thread, and the button is
+    enabled again once it finishes
+    """
+    doc_node = pdf_nodes[0]
+    app.tree.remove_children(doc_node)
+    tool = AutoTools(doc_node)
+    job = tool.extract_text(tool.tesseract_btn)
+    job.join()
+    assert not tool.tesseract_btn.disabled
+    assert len(doc_node.data["children"]) == 1
+    assert doc_node.controller.subtree_text(doc_node).strip()
+    app.tree.remove_children(doc_node)
+
+
+def test_render_once(app, pdf_nodes):
+    """
+    With "Render pages once" checked the pages of the selected pdf are kept
+    between jobs, until the setting is unchecked
+    """
+    doc_node = pdf_nodes[0]
+    tool = AutoTools(doc_node)
+    tool.render_once.value = True
+    tool.extract_text()
+    imgs = tool._imgs
+    assert len(imgs.cache) == len(imgs)
+    tool.extract_text()
+    assert tool._imgs is imgs
+    tool.render_once.value = False
+    assert tool._imgs is None
+    app.tree.remove_children(doc_node)
+
+
+def test_words_in_boxes():
+    """
+    Words go to the smallest box containing their centre, words outside
+    every box are dropped, and reading order is kept
+    """
+    df = pd.DataFrame(
+        {
+            "text": ["title", "inner", "outer", "stray", "more"],
+            "left": [10, 30, 70, 190, 30],
+            "top": [10, 30, 70, 190, 40],
+            "width": [10, 10, 10, 5, 10],
+            "height": [5, 5, 5, 5, 5],
+        }
+    )
+    # [x1, x2, y1, y2] relative to a 200x200 image
+    boxes = [[0, 0.5, 0, 0.5], [0.1, 0.25, 0.1, 0.25], [0.5, 0.6, 0.5, 0.6]]
+    assert words_in_boxes(df, boxes, 200, 200) == [
+        "title outer",
+        "inner more",
+        "",
+    ]
+    assert words_in_boxes(df.iloc[:0], boxes, 200, 200) == ["", "", ""]
+    assert words_in_boxes(df, [], 200, 200) == []
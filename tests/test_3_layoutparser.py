@@ -1,5 +1,7 @@
 from collections import defaultdict
 
+import pytest
+
 from ipypdf.widgets.node_tools import AutoTools
 
 
@@ -39,3 +41,132 @@ def test_parse_layout(app, pdf_nodes):
     # assert len(types["image"]) == 1, f"Did not find image {types.keys()}"
     assert len(types["table"]) == 1, f"Did not find table {types.keys()}"
     assert len(types["text"]) == 6
+
+
+def test_parse_corpus(tmp_path):
+    """
+    Check that the corpus runner writes json which can be loaded back
+    into the tree, and that a broken pdf is reported without stopping
+    the batch.
+    """
+    import shutil
+
+    from ipypdf.utils.corpus import parse_corpus
+    from ipypdf.utils.tree_utils import load_from_json
+    from ipypdf.widgets.better_tree import Tree
+
+    from .conftest import DOC_DIR
+
+    shutil.copy(DOC_DIR / "sample_pdfs" / "doc.pdf", tmp_path / "doc.pdf")
+    (tmp_path / "broken.pdf").write_text("not a pdf")
+
+    report = parse_corpus(tmp_path, n_workers=1)
+    assert report["documents"] == 2
+    assert list(report["failures"]) == [str(tmp_path / "broken.pdf")]
+
+    tree = Tree()
+    tree.rglob(tmp_path, "*.pdf")
+    doc_node = tree.registry[str(tmp_path / "doc.pdf")]
+    load_from_json(tmp_path / "doc.json", parent=doc_node)
+    assert len(doc_node.data["children"]) > 0
+
+
+def test_parse_corpus_worker_failure(tmp_path):
+    """
+    If the workers cannot load the model, every document should be
+    reported as failed instead of the whole batch raising
+    """
+    import shutil
+
+    from ipypdf.utils.corpus import parse_corpus
+
+    from .conftest import DOC_DIR
+
+    shutil.copy(DOC_DIR / "sample_pdfs" / "doc.pdf", tmp_path / "doc.pdf")
+    report = parse_corpus(tmp_path, n_workers=1, backend="missing")
+    assert report["documents"] == 1
+    assert list(report["failures"]) == [str(tmp_path / "doc.pdf")]
+    assert not (tmp_path / "doc.json").exists()
+
+
+def test_get_analyzer_validates_backend():
+    """Bad backends are rejected before the model is loaded"""
+    from ipypdf.utils.lp_util import get_analyzer
+
+    with pytest.raises(ValueError, match="'default', 'cpu'"):
+        get_analyzer(backend="missing")
+    with pytest.raises(ValueError, match="dtype"):
+        get_analyzer(dtype="int8")
+    with pytest.raises(ValueError, match="'cpu'"):
+        get_analyzer(backend="cpu", thread=2)
+
+
+def test_parse_layout_fused(app, pdf_nodes):
+    """
+    Layout blocks filled in by Tesseract should keep the same structure
+    and still contain text
+    """
+    doc_node = pdf_nodes[0]
+    app.tree.remove_children(doc_node)
+
+    tool = AutoTools(doc_node)
+    tool.fuse_ocr.value = True
+    tool.extract_layout()
+
+    texts = [
+        x.data["content"][0]["value"]
+        for x in app.tree.dfs(doc_node.id)
+        if x.data["type"] == "text"
+    ]
+    assert len(texts) > 0
+    assert any(t.strip() for t in texts)
+    app.tree.remove_children(doc_node)
+
+
+def test_iter_layout_nodes(pdf_nodes):
+    """
+    Layout nodes are produced one batch per page
+    """
+    from ipypdf.utils.image_utils import ImageContainer
+    from ipypdf.utils.tree_utils import file_path
+
+    doc_node = pdf_nodes[0]
+    path = file_path(doc_node)
+    batches = list(AutoTools(doc_node).iter_layout_nodes(path))
+    assert (
+        len(batches) == ImageContainer(path, bulk_render=False).info["Pages"]
+    )
+    assert all(isinstance(b, list) for b in batches)
+
+
+def test_optimize_for_cpu():
+    """
+    The cpu backend should report how many layers it converted, and warn
+    when there was nothing to convert
+    """
+    from types import SimpleNamespace
+
+    import pytest
+    import torch
+
+    from ipypdf.utils.lp_util import optimize_for_cpu
+
+    model = torch.nn.Sequential(
+        torch.nn.Conv2d(3, 4, 3), torch.nn.Flatten(), torch.nn.Linear(16, 2)
+    )
+    analyzer = SimpleNamespace(
+        pipe_component_list=[
+            SimpleNamespace(predictor=SimpleNamespace(model=model)),
+            SimpleNamespace(),  # a component without a predictor
+        ]
+    )
+    predictor = analyzer.pipe_component_list[0].predictor
+    optimize_for_cpu(analyzer)
+    assert analyzer.cpu_optimization == {"linear": 1, "conv": 1}
+    assert predictor.model is not model
+    assert predictor.model(torch.zeros(1, 3, 4, 4)).shape == (1, 2)
+
+    empty = SimpleNamespace(pipe_component_list=[])
+    with pytest.warns(UserWarning, match="no torch models"):
+        optimize_for_cpu(empty)
+    assert empty.cpu_optimization == {"linear": 0, "conv": 0}
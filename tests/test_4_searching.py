@@ -6,3 +6,9 @@ def test_search(root_node):
     assert len(tool.results) == 0
     tool.search(query="Disclaimer", case_sensitive=False)
     assert len(tool.results) > 0, "No results found"
+
+
+def test_fuzzy_search(root_node):
+    tool = Search(root_node)
+    tool.search(query="Heading l (Pure Tcxt)", fuzzy=True)
+    assert [n.data["label"] for n in tool.results] == ["Heading 1 (Pure Text)"]
@@ -0,0 +1,152 @@
+import cv2
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from ipypdf.utils.table_extraction import (
+    boxes_2_grid,
+    contains,
+    grid_2_table,
+    projections,
+    ruled_grid_detect,
+    ruled_img_2_table,
+)
+
+
+def test_projections():
+    """
+    Row and column densities should match those of a painted word mask
+    """
+    boxes = np.array([[0, 0, 2, 3], [3, 1, 5, 2]])  # second box is clipped
+    mask = np.zeros((4, 4))  # (w, h)
+    for x, y, w, h in boxes:
+        mask[x : x + w, y : y + h] = 1
+    rows, cols = projections(boxes, (4, 4))
+    assert rows.tolist() == mask.sum(axis=0).tolist()
+    assert cols.tolist() == mask.sum(axis=1).tolist()
+
+
+def test_boxes_2_grid():
+    """
+    Three rows of words in two columns should produce a 3x2 grid
+    which covers the whole image
+    """
+    boxes = np.array(
+        [
+            [10, 10, 80, 20],
+            [200, 10, 60, 20],
+            [10, 60, 70, 20],
+            [200, 60, 90, 20],
+            [10, 110, 50, 20],
+            [200, 110, 40, 20],
+        ]
+    )
+    grid = boxes_2_grid(boxes, (300, 140))
+    assert len(grid) == 6
+    assert grid[0][:2] == [0, 0]
+    x, y, w, h = grid[-1]
+    assert (x + w, y + h) == (299, 139)
+
+
+def test_grid_2_table_matches_contains():
+    """
+    Binning words with searchsorted must give the same table as testing
+    every word against every cell with `contains`
+    """
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        w, h = rng.integers(100, 900), rng.integers(100, 600)
+        n = rng.integers(30, 300)
+        boxes = np.stack(
+            [
+                rng.integers(0, w, n),
+                rng.integers(0, h, n),
+                rng.integers(0, 60, n),
+                rng.integers(0, 30, n),
+            ],
+            axis=1,
+        )
+        df = pd.DataFrame(boxes, columns=["left", "top", "width", "height"])
+        df["text"] = [f"w{i}" for i in range(n)]
+        grid = boxes_2_grid(boxes, (w, h))
+
+        expected = [[""] for cell in grid]
+        for bbox, text in zip(boxes, df["text"]):
+            for j, cell in enumerate(grid):
+                if contains(cell, bbox):
+                    expected[j].append(text)
+        expected = [" ".join(x) for x in expected]
+        ncols = len(set(x[0] for x in grid))
+        expected = [
+            expected[i : i + ncols] for i in range(0, len(expected), ncols)
+        ]
+
+        assert grid_2_table(grid, df) == expected
+
+
+def test_ruled_grid_detect():
+    """
+    A 3x2 table drawn with rules (and a margin around the border) should
+    produce one cell per box, and nothing for unruled images
+    """
+    im = np.full((300, 500, 3), 255, np.uint8)
+    for y in [10, 100, 200, 290]:
+        cv2.line(im, (10, y), (490, y), (0, 0, 0), 2)
+    for x in [10, 150, 490]:
+        cv2.line(im, (x, 10), (x, 290), (0, 0, 0), 2)
+    cv2.putText(
+        im, "cell", (30, 60), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2
+    )
+
+    grid = ruled_grid_detect(Image.fromarray(im))
+    assert len(grid) == 6
+    assert grid[0] == [10, 10, 140, 90]
+
+    blank = Image.fromarray(np.full((50, 50, 3), 255, np.uint8))
+    assert ruled_grid_detect(blank) is None
+
+
+def test_ruled_img_2_table():
+    """
+    The words of a ruled table are read in one pass and placed in their
+    cells, without the rules being read as text
+    """
+    im = np.full((300, 500, 3), 255, np.uint8)
+    for y in [10, 100, 200, 290]:
+        cv2.line(im, (10, y), (490, y), (0, 0, 0), 2)
+    for x in [10, 150, 490]:
+        cv2.line(im, (x, 10), (x, 290), (0, 0, 0), 2)
+    cv2.putText(
+        im, "TOTAL", (30, 70), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 3
+    )
+
+    rows = ruled_img_2_table(Image.fromarray(im))
+    assert len(rows) == 3 and all(len(r) == 2 for r in rows)
+    assert rows[0][0].strip()
+    others = [c for r in rows for c in r][1:]
+    assert not any(c.strip() for c in others)
+
+
+def test_parse_tables():
+    """
+    Tables are grouped by page and failures are reported per table
+    """
+    from ipypdf.utils.table_extraction import parse_tables
+
+    pages = [Image.new("RGB", (100, 100)), Image.new("RGB", (200, 100))]
+    jobs = [
+        ("a", 0, [0, 0.5, 0, 0.5]),
+        ("b", 1, [0, 0.5, 0, 1]),
+        ("c", 1, [0, 0, 0, 0]),
+    ]
+
+    def engine(im):
+        if im.width == 0:
+            raise ValueError("empty crop")
+        return [[str(im.width), str(im.height)]]
+
+    report = parse_tables(pages, jobs, engine)
+    assert report["a"]["rows"] == [["50", "50"]]
+    assert report["b"]["rows"] == [["100", "100"]]
+    assert report["c"]["rows"] is None
+    assert "empty crop" in report["c"]["error"]
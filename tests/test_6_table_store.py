@@ -0,0 +1,95 @@
+from ipypdf.utils import table_store
+from ipypdf.widgets.better_tree import Tree
+
+ROWS = [
+    ["Name", "Amount", "Amount"],
+    ["a", "$1,200", "(3)"],
+    ["b", "", "4.5"],
+]
+
+
+def table_tree(tmp_path):
+    (tmp_path / "doc.pdf").write_bytes(b"")
+    tree = Tree()
+    tree.rglob(tmp_path, "*.pdf")
+    node = tree.insert(
+        {
+            "type": "table",
+            "children": [],
+            "content": [{"value": None, "page": 0, "coords": [0, 1, 0, 1]}],
+            "table": ROWS,
+        },
+        str(tmp_path / "doc.pdf"),
+    )
+    return tree, node
+
+
+def test_typed_columns():
+    """Cells keep their text and numbers are parsed separately"""
+    df = table_store.rows_2_frame(ROWS + [["007", "1", "2"]])
+    assert list(df.columns) == ["Name", "Amount", "Amount.1"]
+    assert df["Amount"].tolist() == ["$1,200", "", "1"]
+    assert df["Name"].tolist() == ["a", "b", "007"]
+
+    typed = table_store.typed_frame(df)
+    assert typed["Amount"].dtype == float
+    assert typed["Amount.1"].tolist() == [-3.0, 4.5, 2.0]
+    assert typed["Name"].tolist() == ["a", "b", "007"]
+    assert df["Amount"].tolist() == ["$1,200", "", "1"]
+
+
+def test_unique_columns():
+    assert table_store._unique(["a", "a", "a.1", "a"]) == [
+        "a",
+        "a.1",
+        "a.1.1",
+        "a.2",
+    ]
+
+
+def test_side_file(tmp_path):
+    """
+    Tables are moved out of the node data into a parquet file which is
+    read back lazily
+    """
+    tree, node = table_tree(tmp_path)
+    table_store.store_tables(tree.root)
+    assert "table" not in node.data
+    assert (tmp_path / node.data["table_file"]).exists()
+
+    table_store._FRAMES.clear()
+    df = table_store.get_table(node)
+    assert df.equals(table_store.rows_2_frame(ROWS))
+
+
+def test_export_tables(tmp_path):
+    tree, node = table_tree(tmp_path)
+    result = table_store.export_tables(tree, tmp_path / "tables.parquet")
+    assert len(result) == 6
+    assert set(result["node_id"]) == {node.id}
+    assert result["number"].count() == 3
+    cell = result[(result["row"] == 0) & (result["column"] == 1)]
+    assert cell["value"].tolist() == ["$1,200"]
+    assert cell["number"].tolist() == [1200.0]
+    assert result[result["header"] == "Name"]["number"].isna().all()
+
+
+def test_export_reserved_headers(tmp_path):
+    """Headers which collide with the export columns are kept as text"""
+    tree, node = table_tree(tmp_path)
+    table_store.set_table(node, [["row", "value"], ["x", "1"], ["y", "2"]])
+    result = table_store.export_tables(tree, tmp_path / "tables.csv")
+    assert result["header"].tolist() == ["row", "row", "value", "value"]
+    assert result["value"].tolist() == ["x", "y", "1", "2"]
+    assert result["row"].tolist() == [0, 1, 0, 1]
+    assert result["number"].tolist()[2:] == [1.0, 2.0]
+
+
+def test_remove_stale_tables(tmp_path):
+    """Side files of deleted table nodes are removed on the next store"""
+    tree, node = table_tree(tmp_path)
+    table_store.store_tables(tree.root)
+    path = tmp_path / node.data["table_file"]
+    tree.remove(node.id)
+    table_store.store_tables(tree.root)
+    assert not path.exists()
@@ -0,0 +1,142 @@
+import random
+
+from ipypdf.utils.nlp import (
+    TfidfIndex,
+    normalize,
+    normalize_many,
+    similarity_graph,
+    tfidf_matrix,
+    tfidf_similarity,
+)
+
+DOCS = {
+    "a": "tables of quarterly revenue",
+    "b": "quarterly revenue tables",
+    "c": "safety procedures for the lab",
+    "d": "lab safety procedures",
+    "e": "unrelated",
+}
+
+
+def test_tfidf_similarity_pairs():
+    """
+    Every pair of documents with shared terms is returned once as
+    [source, target, weight]
+    """
+    sim = tfidf_similarity(DOCS)
+    keys = ["a", "b", "c", "d"]  # "e" has no terms shared with the others
+    assert len(sim) == len(keys) * (len(keys) - 1) / 2
+    weights = {(s, t): w for s, t, w in sim}
+    assert abs(weights[("a", "b")] - 1) < 1e-9
+    assert weights[("a", "c")] == 0
+
+
+def test_tfidf_similarity_threshold():
+    sim = tfidf_similarity(DOCS, threshold=0.5)
+    assert sorted((s, t) for s, t, _ in sim) == [("a", "b"), ("c", "d")]
+
+
+def test_similarity_graph_matches_pairs():
+    """The sparse graph holds the same non-zero weights as the pair list"""
+    keys, S = similarity_graph(DOCS, block_size=2)
+    graph = {(keys[i], keys[j]): w for (i, j), w in S.todok().items()}
+    pairs = {(s, t): w for s, t, w in tfidf_similarity(DOCS) if w > 0}
+    assert graph.keys() == pairs.keys()
+    for pair, w in pairs.items():
+        assert abs(graph[pair] - w) < 1e-9
+
+
+def test_similarity_graph_top_k():
+    docs = {i: "alpha beta gamma delta"[: 6 + 2 * i] for i in range(8)}
+    docs.update({"x": "alpha beta", "y": "alpha beta"})
+    keys, S = similarity_graph(docs, top_k=1)
+    degree = (S + S.T).getnnz(axis=1)
+    assert degree.min() >= 1
+    assert S.nnz <= len(keys)
+
+
+def test_tfidf_index_matches_rebuild():
+    """
+    Editing a few documents re-tokenises only those documents and yields the
+    same graph as building it from scratch
+    """
+    rng = random.Random(0)
+    vocab = [f"term{i}" for i in range(2000)]
+    docs = {i: " ".join(rng.choices(vocab, k=40)) for i in range(200)}
+    index = TfidfIndex()
+    for _ in range(5):
+        for k in rng.sample(list(docs), 2):
+            docs[k] = " ".join(rng.choices(vocab, k=40))
+        keys, S = index.similarity_graph(docs, top_k=3)
+        expected_keys, expected = similarity_graph(docs, top_k=3)
+        assert keys == expected_keys
+        assert abs(S - expected).max() < 1e-9
+    assert index.update(docs) == []
+    docs[0] = "changed"
+    assert index.update(docs) == [0]
+
+
+def test_tfidf_index_empty_documents():
+    """
+    Documents left without terms are dropped by both the index and
+    `tfidf_matrix`, and still count towards the document frequencies
+    """
+    docs = dict(DOCS, f="", g="the and", h="tables lab")
+    index = TfidfIndex()
+    index.update(docs)
+    keys, X = index.matrix(list(docs))
+    expected_keys, expected = tfidf_matrix(docs)
+    assert keys == expected_keys == ["a", "b", "c", "d", "h"]
+    assert abs((X @ X.T) - (expected @ expected.T)).max() < 1e-9
+    keys, S = index.similarity_graph(docs)
+    expected_keys, expected = similarity_graph(docs)
+    assert keys == expected_keys
+    assert abs(S - expected).max() < 1e-9
+
+
+def test_tfidf_index_vocabulary():
+    """Terms no document uses anymore are dropped from the vocabulary"""
+    index = TfidfIndex()
+    for i in range(10):
+        docs = {k: f"{v} draft{i} note{i} rev{i}" for k, v in DOCS.items()}
+        keys, S = index.similarity_graph(docs)
+        assert len(index.vocab) <= 2 * len(index.df)
+        expected_keys, expected = similarity_graph(docs)
+        assert keys == expected_keys
+        assert abs(S - expected).max() < 1e-9
+    assert len(index.vocab) < 30
+    index.remove(list(DOCS))
+    assert index.vocab == {}
+
+
+def test_normalize_golden():
+    """
+    Changes to the normalisation change every similarity score, so they
+    should show up here first
+    """
+    text = "The Ranking (of 2 tables) -- and the INDEXING, for one... Reading!"
+    assert normalize(text) == ["rank", "of", "tables", "index", "read"]
+    assert normalize_many({"x": text, "y": ""}) == {
+        "x": normalize(text),
+        "y": [],
+    }
+    docs = {
+        "a": "Revenue, by region (2019): north, south.",
+        "b": "Revenue by region: north & south!",
+        "c": "Testing the lab safety procedures.",
+        "d": "Lab safety - testing procedures?",
+        "e": "Revenue, testing.",
+    }
+    weights = {(s, t): round(w, 6) for s, t, w in tfidf_similarity(docs)}
+    assert weights == {
+        ("a", "e"): 0.254,
+        ("a", "d"): 0.0,
+        ("a", "c"): 0.0,
+        ("a", "b"): 1.0,
+        ("b", "e"): 0.254,
+        ("b", "d"): 0.0,
+        ("b", "c"): 0.0,
+        ("c", "e"): 0.254,
+        ("c", "d"): 1.0,
+        ("d", "e"): 0.254,
+    }
@@ -0,0 +1,85 @@
+from ipypdf.utils.lsh import MinHashLSH, index_document, node_texts
+
+BOILERPLATE = (
+    "this document is provided for information purposes only and does not"
+    " constitute an offer of any securities in any jurisdiction"
+)
+DOCS = {
+    "a": BOILERPLATE,
+    "b": BOILERPLATE + " whatsoever",
+    "c": "quarterly revenue grew in every region except the north east",
+    "d": "",
+}
+
+
+def build():
+    index = MinHashLSH()
+    for k, v in DOCS.items():
+        index.add(k, v)
+    return index
+
+
+def test_duplicates():
+    index = build()
+    assert "d" not in index  # no words
+    pairs = index.duplicates(threshold=0.5)
+    assert [(a, b) if a < b else (b, a) for a, b, _ in pairs] == [("a", "b")]
+    assert index.query(BOILERPLATE)[0] == ("a", 1.0)
+    assert [k for k, _ in index.similar("a")] == ["b"]
+
+
+def test_replace_and_remove():
+    index = build()
+    index.add("b", DOCS["c"])
+    assert [k for k, _ in index.similar("c")] == ["b"]
+    index.remove("b")
+    assert len(index) == 2
+    assert index.similar("a") == []
+
+
+def test_save_load(tmp_path):
+    index = build()
+    index.save(tmp_path / "index.npz")
+    loaded = MinHashLSH.load(tmp_path / "index.npz")
+    assert set(loaded.signatures) == set(index.signatures)
+    assert loaded.duplicates() == index.duplicates()
+
+
+def document(prefix, boilerplate, body):
+    return [
+        {"id": f"{prefix}s1", "type": "section", "children": [f"{prefix}t1"]},
+        {"id": f"{prefix}s2", "type": "section", "children": [f"{prefix}t2"]},
+        {
+            "id": f"{prefix}t1",
+            "type": "text",
+            "children": [],
+            "content": [{"value": boilerplate}],
+        },
+        {
+            "id": f"{prefix}t2",
+            "type": "text",
+            "children": [],
+            "content": [{"value": body}],
+        },
+    ]
+
+
+def test_index_document(tmp_path):
+    """
+    Documents and sections are indexed separately, so a document is never
+    paired with its own sections
+    """
+    a = document("a", BOILERPLATE, DOCS["c"])
+    b = document("b", DOCS["b"], "safety procedures for the lab in building b")
+    assert node_texts(a) == {"as1": BOILERPLATE, "as2": DOCS["c"]}
+    index, sections = MinHashLSH(), MinHashLSH()
+    index_document(index, tmp_path / "a.pdf", a, section_index=sections)
+    index_document(index, tmp_path / "b.pdf", b, section_index=sections)
+    assert set(index.signatures) == {
+        str(tmp_path / "a.pdf"),
+        str(tmp_path / "b.pdf"),
+    }
+    assert set(sections.signatures) == {"as1", "as2", "bs1", "bs2"}
+    pairs = sections.duplicates(threshold=0.5)
+    assert [sorted([x, y]) for x, y, _ in pairs] == [["as1", "bs1"]]
+    assert index.duplicates(threshold=0.5) == []
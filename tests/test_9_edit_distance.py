@@ -0,0 +1,48 @@
+import random
+
+from ipypdf.utils.edit_distance import (
+    best_matches,
+    levenshtein,
+    levenshtein_many,
+)
+from ipypdf.utils.nlp import levenshtein_distance
+
+
+def naive(s, t):
+    prev = list(range(len(t) + 1))
+    for i, a in enumerate(s, 1):
+        cur = [i]
+        for j, b in enumerate(t, 1):
+            cur.append(
+                min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (a != b))
+            )
+        prev = cur
+    return prev[-1]
+
+
+def test_levenshtein_matches_naive():
+    """Includes strings longer than 64 characters"""
+    rng = random.Random(0)
+    for _ in range(500):
+        s = "".join(rng.choices("abc", k=rng.randint(0, 100)))
+        t = "".join(rng.choices("abc", k=rng.randint(0, 100)))
+        d = naive(s, t)
+        assert levenshtein(s, t) == d
+        assert levenshtein(s, t, max_distance=10) == min(d, 11)
+        assert levenshtein_many(s, [t, s]) == [d, 0]
+    assert levenshtein_distance("kitten", "sitting") == 3
+
+
+def test_best_matches():
+    headings = {
+        "a": "Introduction",
+        "b": "1ntroducti0n",  # OCR errors
+        "c": "Results",
+    }
+    assert best_matches("Introduction", headings, max_distance=2) == [
+        ("a", 0),
+        ("b", 2),
+    ]
+    assert best_matches("Resu1ts", list(headings.values()), limit=1) == [
+        ("Results", 1)
+    ]